@@ -3,6 +3,12 @@ ASGI config for OpenEye project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The scan status, progress-stream, results and zap-status endpoints are async
+views, so serving through ASGI lets one process hold many idle pollers and
+progress streams without tying up a worker thread each, e.g.:
+
+    uvicorn OpenEye.asgi:application --host 0.0.0.0 --port 8000
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -14,3 +20,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OpenEye.settings')
 
 application = get_asgi_application()
+
+# Pick up scans orphaned by a previous process, keep watching for stale leases
+# and keep a heartbeat on the ZAP instances
+from scanner.recovery import start_scan_reaper  # noqa: E402
+from scanner.health import start_zap_health_monitor  # noqa: E402
+
+start_scan_reaper()
+start_zap_health_monitor()
@@ -97,6 +97,26 @@ DATABASES = {
 # ZAP Configuration
 ZAP_API_URL = os.environ.get('ZAP_API_URL', 'http://localhost:8080')
 ZAP_API_KEY = os.environ.get('ZAP_API_KEY', None)
+# Comma-separated ZAP API URLs to spread scans over; defaults to ZAP_API_URL
+ZAP_INSTANCES = [url for url in os.environ.get('ZAP_INSTANCES', ZAP_API_URL).split(',') if url]
+ZAP_HEALTH_INTERVAL = int(os.environ.get('ZAP_HEALTH_INTERVAL', 15))
+
+# Cache (recent-scans fragments, ...). Local memory is per process; point
+# CACHE_BACKEND at the file-based or a shared backend when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'openeye'),
+    }
+}
+RECENT_SCANS_CACHE_TIMEOUT = int(os.environ.get('RECENT_SCANS_CACHE_TIMEOUT', 300))
+
+# Scan result retention: results older than this are moved to the archive store
+SCAN_RETENTION_DAYS = int(os.environ.get('SCAN_RETENTION_DAYS', 90))
+SCAN_ARCHIVE_ROOT = os.environ.get('SCAN_ARCHIVE_ROOT', BASE_DIR / 'archive')
+
+# Pre-rendered scan reports (compressed, content-addressed artifacts)
+SCAN_REPORT_ROOT = os.environ.get('SCAN_REPORT_ROOT', BASE_DIR / 'reports')
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
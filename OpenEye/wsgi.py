@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OpenEye.settings')
 
 application = get_wsgi_application()
+
+# Pick up scans orphaned by a previous process, keep watching for stale leases
+# and keep a heartbeat on the ZAP instances
+from scanner.recovery import start_scan_reaper  # noqa: E402
+from scanner.health import start_zap_health_monitor  # noqa: E402
+
+start_scan_reaper()
+start_zap_health_monitor()
@@ -0,0 +1,106 @@
+import hashlib
+from typing import Dict, Any, List
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+from django.conf import settings
+
+# Instances kept inline with each alert group; the rest are paged from the ScanAlert table
+ALERT_SAMPLE_SIZE = getattr(settings, 'ALERT_SAMPLE_SIZE', 3)
+
+RISK_ORDER = {'High': 0, 'Medium': 1, 'Low': 2, 'Informational': 3}
+
+# Rule-level fields shared by every instance of an alert
+GROUP_FIELDS = ('name', 'risk', 'confidence', 'description', 'solution', 'reference', 'cweid', 'wascid')
+INSTANCE_FIELDS = ('url', 'param', 'method', 'evidence')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of an alert URL for fingerprinting
+
+    Lower-cases scheme and host, drops default ports and fragments, and keeps
+    only the sorted query parameter names, since values (tokens, timestamps)
+    usually change between scans.
+    """
+    parts = urlsplit(url or '')
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    query = '&'.join(sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)}))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+def fingerprint_alert(alert: Dict[str, Any]) -> str:
+    """Stable identity of a finding: plugin + normalized URL + parameter + HTTP method"""
+    key = '|'.join([
+        str(alert.get('pluginId', '')),
+        normalize_url(alert.get('url', '')),
+        alert.get('param', '') or '',
+        (alert.get('method', '') or '').upper(),
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def group_alerts(alerts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Collapse per-URL alert instances into one record per rule and risk
+
+    Each group keeps the rule's description and solution, the instance count
+    and the first ALERT_SAMPLE_SIZE instances (URL, parameter, method and
+    evidence). Instances are deduplicated by fingerprint, as in the ScanAlert
+    index, so counts match the paged instances. Groups are ordered by risk,
+    then by instance count.
+    """
+    groups = {}
+    seen = set()
+    for alert in alerts:
+        fingerprint = fingerprint_alert(alert)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        plugin_id = str(alert.get('pluginId', ''))
+        name = alert.get('name') or alert.get('alert', '')
+        key = (alert.get('source', ''), plugin_id or name, alert.get('risk', 'Informational'))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {field: alert.get(field, '') for field in GROUP_FIELDS}
+            group.update({
+                'name': name,
+                'risk': key[2],
+                'plugin_id': plugin_id,
+                'source': key[0],
+                'count': 0,
+                'samples': [],
+            })
+        group['count'] += 1
+        if len(group['samples']) < ALERT_SAMPLE_SIZE:
+            group['samples'].append({field: alert.get(field, '') for field in INSTANCE_FIELDS})
+
+    return sorted(groups.values(), key=lambda group: (RISK_ORDER.get(group['risk'], 4), -group['count']))
+
+def summarize_groups(groups: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Count deduplicated findings by risk level, in the shape of zap.summarize_alerts"""
+    summary = {'total_alerts': 0, 'high_risk': 0, 'medium_risk': 0, 'low_risk': 0, 'informational': 0}
+    for group in groups:
+        key = {'High': 'high_risk', 'Medium': 'medium_risk', 'Low': 'low_risk'}.get(group['risk'], 'informational')
+        summary[key] += group['count']
+        summary['total_alerts'] += group['count']
+    return summary
+
+def compact_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replace the raw alert list of scan results with alert groups (no-op if already compact)
+
+    The summary is recounted from the groups so it matches the deduplicated
+    findings rather than the raw instances the engines reported.
+    """
+    if not results or 'alerts' not in results:
+        return results
+    compact = {key: value for key, value in results.items() if key != 'alerts'}
+    compact['alert_groups'] = group_alerts(results['alerts'])
+    compact['alert_count'] = sum(group['count'] for group in compact['alert_groups'])
+    compact['summary'] = summarize_groups(compact['alert_groups'])
+    return compact
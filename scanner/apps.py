@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ScannerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scanner'
+
+    def ready(self):
+        from . import signals  # noqa: F401
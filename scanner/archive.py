@@ -0,0 +1,149 @@
+import gzip
+import json
+import logging
+from datetime import timedelta
+from typing import Dict, Any, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Retention configuration
+SCAN_RETENTION_DAYS = getattr(settings, 'SCAN_RETENTION_DAYS', 90)
+SCAN_ARCHIVE_ROOT = getattr(settings, 'SCAN_ARCHIVE_ROOT', settings.BASE_DIR / 'archive')
+# Evidence of archived instances stays cached this long, so paging a scan reads its archive once
+ARCHIVED_EVIDENCE_CACHE_TIMEOUT = getattr(settings, 'ARCHIVED_EVIDENCE_CACHE_TIMEOUT', 600)
+
+archive_storage = FileSystemStorage(location=SCAN_ARCHIVE_ROOT)
+
+ARCHIVED_INSTANCE_FIELDS = ('fingerprint', 'source', 'plugin_id', 'name', 'risk', 'url', 'param', 'method', 'evidence')
+
+def _archive_key(scan_result) -> str:
+    """Shard archives by id so no single directory grows unbounded"""
+    return f"{scan_result.pk // 1000:06d}/{scan_result.pk}.json.gz"
+
+def _inline_summary(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the small summary fields inline on the ScanResult row"""
+    inline = {
+        'archived': True,
+        'summary': results.get('summary', {}),
+        'target_url': results.get('target_url'),
+        'scan_completed': results.get('scan_completed', False),
+        'alert_count': results.get('alert_count', len(results.get('alerts', []))),
+    }
+    if 'error' in results:
+        inline['error'] = results['error']
+    return inline
+
+def write_archive(key: str, results: Dict[str, Any]) -> str:
+    """Compress results to the archive store and return the stored key"""
+    payload = gzip.compress(json.dumps(results, separators=(',', ':')).encode('utf-8'))
+    if archive_storage.exists(key):
+        archive_storage.delete(key)
+    return archive_storage.save(key, ContentFile(payload))
+
+def load_archived_results(key: str) -> Dict[str, Any]:
+    """Read and decompress archived results from the archive store"""
+    with archive_storage.open(key, 'rb') as fh:
+        return json.loads(gzip.decompress(fh.read()).decode('utf-8'))
+
+def load_archived_evidence(scan_result) -> Dict[str, str]:
+    """Evidence of an archived scan's alert instances by fingerprint (cached)"""
+    key = f"archived_evidence:{scan_result.pk}:{scan_result.archived_at.timestamp()}"
+    evidence = cache.get(key)
+    if evidence is None:
+        evidence = {
+            instance['fingerprint']: instance['evidence']
+            for instance in load_archived_results(scan_result.archive_key).get('instances', [])
+            if instance['evidence']
+        }
+        cache.set(key, evidence, ARCHIVED_EVIDENCE_CACHE_TIMEOUT)
+    return evidence
+
+def archive_scan_result(scan_result, drop_informational: bool = False) -> bool:
+    """
+    Move a scan's results to the archive store, leaving summary counts inline
+
+    Indexed alert instances are archived too (under 'instances'); their
+    ScanAlert rows keep only the columns diffs and trends need, without
+    evidence.
+
+    Args:
+        scan_result: ScanResult to archive
+        drop_informational: Discard Informational alerts instead of archiving them
+
+    Returns:
+        True if the scan was archived, False if there was nothing to do
+    """
+    if scan_result.is_archived:
+        return False
+
+    results = dict(scan_result.results or {})
+    inline = _inline_summary(results)
+
+    if drop_informational:
+        for field in ('alerts', 'alert_groups'):
+            if field in results:
+                results[field] = [
+                    alert for alert in results[field]
+                    if alert.get('risk') != 'Informational'
+                ]
+        scan_result.alerts.filter(risk='Informational').delete()
+        inline['informational_dropped'] = True
+
+    results['instances'] = list(scan_result.alerts.order_by('url', 'param').values(*ARCHIVED_INSTANCE_FIELDS))
+    key = write_archive(_archive_key(scan_result), results)
+    scan_result.alerts.exclude(evidence='').update(evidence='')
+
+    scan_result.results = inline
+    scan_result.archive_key = key
+    scan_result.archived_at = timezone.now()
+    scan_result.save(update_fields=['results', 'archive_key', 'archived_at', 'updated_at'])
+    return True
+
+def get_archive_candidates(days: int = SCAN_RETENTION_DAYS):
+    """Finished, not yet archived scans that completed more than `days` ago"""
+    from .models import ScanResult
+
+    cutoff = timezone.now() - timedelta(days=days)
+    return ScanResult.objects.filter(
+        archived_at__isnull=True,
+        status__in=['completed', 'failed'],
+        completed_at__lt=cutoff,
+    ).order_by('pk')
+
+def archive_scans(days: int = SCAN_RETENTION_DAYS, batch_size: int = 100,
+                  drop_informational: bool = False, limit: int = None) -> int:
+    """
+    Archive old scans in batches, each batch in its own transaction
+
+    Returns:
+        Number of scans archived
+    """
+    from .models import ScanResult
+
+    candidate_ids: List[int] = list(get_archive_candidates(days).values_list('pk', flat=True)[:limit])
+    archived = 0
+
+    for start in range(0, len(candidate_ids), batch_size):
+        batch_ids = candidate_ids[start:start + batch_size]
+        with transaction.atomic():
+            batch = ScanResult.objects.select_for_update(skip_locked=True).filter(
+                pk__in=batch_ids, archived_at__isnull=True
+            )
+            for scan_result in batch:
+                try:
+                    # A savepoint per scan, so one database error does not abort the whole batch
+                    with transaction.atomic():
+                        if archive_scan_result(scan_result, drop_informational):
+                            archived += 1
+                except Exception as e:
+                    logger.error(f"Failed to archive scan {scan_result.pk}: {e}")
+        logger.info(f"Archived {archived}/{len(candidate_ids)} scans")
+
+    return archived
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Per-user recent-scans cache, invalidated by signals when a ScanResult changes
+RECENT_SCANS_LIMIT = 6
+RECENT_SCANS_CACHE_TIMEOUT = getattr(settings, 'RECENT_SCANS_CACHE_TIMEOUT', 300)
+RECENT_SCANS_TEMPLATES = {
+    'home': 'scanner/partials/recent_scans_home.html',
+    'scan': 'scanner/partials/recent_scans_scan.html',
+}
+
+def _recent_scans_key(user_id):
+    return f"recent_scans:{user_id}"
+
+def _fragment_key(user_id, variant):
+    return f"recent_scans_html:{user_id}:{variant}"
+
+def get_recent_scans(user_id):
+    """A user's most recent scans, with only the fields the recent-scans cards show"""
+    key = _recent_scans_key(user_id)
+    recent_scans = cache.get(key)
+    if recent_scans is None:
+        from .models import ScanResult
+        recent_scans = list(
+            ScanResult.objects.filter(user_id=user_id)
+            .only('id', 'target_url', 'tool', 'status', 'created_at')[:RECENT_SCANS_LIMIT]
+        )
+        cache.set(key, recent_scans, RECENT_SCANS_CACHE_TIMEOUT)
+    return recent_scans
+
+def render_recent_scans(user_id, variant):
+    """Rendered recent-scans block for the home ('home') or scan ('scan') page"""
+    key = _fragment_key(user_id, variant)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(RECENT_SCANS_TEMPLATES[variant], {
+            'recent_scans': get_recent_scans(user_id),
+        })
+        cache.set(key, html, RECENT_SCANS_CACHE_TIMEOUT)
+    return mark_safe(html)
+
+def invalidate_recent_scans(user_id):
+    """Drop a user's cached recent-scans list and fragments"""
+    cache.delete_many(
+        [_recent_scans_key(user_id)] + [_fragment_key(user_id, variant) for variant in RECENT_SCANS_TEMPLATES]
+    )
@@ -0,0 +1,94 @@
+import logging
+from typing import Dict, Any, List, Optional
+
+from .aggregation import fingerprint_alert
+from .models import ScanAlert, ScanDiff, ScanResult
+
+logger = logging.getLogger(__name__)
+
+def index_scan_alerts(scan_result: ScanResult, alerts: Optional[List[Dict[str, Any]]] = None,
+                      batch_size: int = 1000) -> int:
+    """
+    (Re)build the fingerprint index of a scan's alerts
+
+    Returns:
+        Number of distinct findings indexed
+    """
+    if alerts is None:
+        alerts = (scan_result.rehydrate() or {}).get('alerts', [])
+
+    rows = {}
+    for alert in alerts:
+        fingerprint = fingerprint_alert(alert)
+        if fingerprint not in rows:
+            rows[fingerprint] = ScanAlert(
+                scan=scan_result,
+                fingerprint=fingerprint,
+                plugin_id=str(alert.get('pluginId', ''))[:50],
+                name=(alert.get('name') or alert.get('alert') or '')[:255],
+                risk=alert.get('risk', 'Informational'),
+                url=alert.get('url', ''),
+                param=(alert.get('param') or '')[:255],
+                method=(alert.get('method') or '')[:10],
+                source=alert.get('source', ''),
+                evidence=alert.get('evidence', '') or '',
+            )
+
+    ScanAlert.objects.filter(scan=scan_result).delete()
+    ScanAlert.objects.bulk_create(rows.values(), batch_size=batch_size, ignore_conflicts=True)
+    return len(rows)
+
+def ensure_scan_indexed(scan_result: ScanResult) -> None:
+    """Index scans that completed before fingerprints were computed at ingestion"""
+    if scan_result.status == 'completed' and not scan_result.alerts.exists():
+        index_scan_alerts(scan_result)
+
+def diff_scans(base: ScanResult, head: ScanResult) -> Dict[str, Any]:
+    """
+    Compare two scans by fingerprint
+
+    Returns:
+        Querysets of ScanAlert rows: 'new' (only in head), 'fixed' (only in
+        base) and 'unchanged' (in both, as reported by head)
+    """
+    base_fingerprints = ScanAlert.objects.filter(scan=base).values('fingerprint')
+    head_fingerprints = ScanAlert.objects.filter(scan=head).values('fingerprint')
+    return {
+        'new': ScanAlert.objects.filter(scan=head).exclude(fingerprint__in=base_fingerprints),
+        'fixed': ScanAlert.objects.filter(scan=base).exclude(fingerprint__in=head_fingerprints),
+        'unchanged': ScanAlert.objects.filter(scan=head, fingerprint__in=base_fingerprints),
+    }
+
+def get_previous_scan(scan_result: ScanResult) -> Optional[ScanResult]:
+    """The last completed scan of the same target by the same user before this one"""
+    return ScanResult.objects.filter(
+        user_id=scan_result.user_id,
+        target_url=scan_result.target_url,
+        status='completed',
+        created_at__lt=scan_result.created_at,
+    ).exclude(pk=scan_result.pk).order_by('-created_at').first()
+
+def record_previous_diff(scan_result: ScanResult) -> Optional[ScanDiff]:
+    """Store the latest-vs-previous diff counts for a completed scan"""
+    baseline = get_previous_scan(scan_result)
+    if baseline is None:
+        return None
+    ensure_scan_indexed(baseline)
+
+    diff = diff_scans(baseline, scan_result)
+    scan_diff, _ = ScanDiff.objects.update_or_create(scan=scan_result, defaults={
+        'baseline': baseline,
+        'new_count': diff['new'].count(),
+        'fixed_count': diff['fixed'].count(),
+        'unchanged_count': diff['unchanged'].count(),
+    })
+    return scan_diff
+
+def ingest_scan_alerts(scan_result: ScanResult, alerts: List[Dict[str, Any]]) -> None:
+    """Fingerprint a finished scan's alerts and, if it completed, diff it against the previous scan"""
+    try:
+        index_scan_alerts(scan_result, alerts)
+        if scan_result.status == 'completed':
+            record_previous_diff(scan_result)
+    except Exception as e:
+        logger.error(f"Failed to index alerts of scan {scan_result.pk}: {e}")
@@ -0,0 +1,637 @@
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Any, Iterator, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import zap
+
+logger = logging.getLogger(__name__)
+
+# Engine execution configuration
+SCAN_ENGINE_WORKERS = getattr(settings, 'SCAN_ENGINE_WORKERS', 4)
+SUBPROCESS_ENGINE_TIMEOUT = getattr(settings, 'SUBPROCESS_ENGINE_TIMEOUT', 3600)
+
+# Values users may choose for engine options that reach a scanner's command line or API
+ZAP_SCAN_POLICIES = getattr(settings, 'ZAP_SCAN_POLICIES', ['Default Policy'])
+ZAP_MAX_CHILDREN_LIMIT = getattr(settings, 'ZAP_MAX_CHILDREN_LIMIT', 100)
+NMAP_SCRIPT_CATEGORIES = getattr(settings, 'NMAP_SCRIPT_CATEGORIES', ['vuln', 'safe', 'default'])
+
+# NSE vulns library verdict, e.g. "State: VULNERABLE" or "State: LIKELY VULNERABLE"
+NMAP_VULN_STATE = re.compile(r'^\s*State:\s*(LIKELY )?VULNERABLE\b', re.MULTILINE)
+
+ENGINE_REGISTRY: Dict[str, type] = {}
+
+def register_engine(engine_class: type) -> type:
+    """Class decorator that makes an engine available under its `name`"""
+    ENGINE_REGISTRY[engine_class.name] = engine_class
+    return engine_class
+
+def get_engine(name: str) -> 'ScanEngine':
+    """Instantiate a registered engine by name"""
+    try:
+        return ENGINE_REGISTRY[name]()
+    except KeyError:
+        raise ValueError(f"Unknown scan engine '{name}'")
+
+def int_option(low: int, high: int) -> Callable[[Any], int]:
+    """Option cleaner accepting integers from low to high"""
+    def clean(value: Any) -> int:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError("must be an integer")
+        value = int(value)
+        if not low <= value <= high:
+            raise ValueError(f"must be between {low} and {high}")
+        return value
+    return clean
+
+def choice_option(choices: List[str]) -> Callable[[Any], str]:
+    """Option cleaner accepting one of a fixed set of values"""
+    def clean(value: Any) -> str:
+        if value not in choices:
+            raise ValueError(f"must be one of {', '.join(choices)}")
+        return value
+    return clean
+
+def normalize_alert(source: str, name: str, risk: str = 'Informational', url: str = '',
+                    **fields) -> Dict[str, Any]:
+    """
+    Build an alert in the shared format (ZAP's alert fields plus `source`)
+
+    Any extra ZAP-style fields (param, method, description, solution,
+    evidence, pluginId, ...) are passed through unchanged.
+    """
+    alert = {
+        'source': source,
+        'name': name,
+        'alert': name,
+        'risk': risk,
+        'url': url,
+        'param': '',
+        'method': '',
+        'description': '',
+        'solution': '',
+        'evidence': '',
+        'pluginId': '',
+    }
+    alert.update(fields)
+    return alert
+
+class ScanEngine:
+    """
+    Interface implemented by every scan engine
+
+    A handle is a JSON-serialisable dict describing one running scan, so it
+    can be stored alongside the ScanResult and passed back to poll/cancel,
+    or to run() to resume the scan after a restart.
+    """
+    name: str = None
+    poll_interval: float = 5
+    # Options users may set in scan_config, mapped to a function that validates and converts a value
+    options: Dict[str, Callable[[Any], Any]] = {}
+
+    def clean_options(self, scan_config: Dict[str, Any]) -> Dict[str, Any]:
+        """The engine's options from a user-supplied scan_config, validated; other keys are dropped"""
+        cleaned = {}
+        for option, clean in self.options.items():
+            if scan_config.get(option) is None:
+                continue
+            try:
+                cleaned[option] = clean(scan_config[option])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Invalid {self.name} option '{option}': {e}")
+        return cleaned
+
+    def can_resume(self, handle: Dict[str, Any]) -> bool:
+        """Whether a scan can be picked up again from a handle saved by another process"""
+        return True
+
+    def prepare(self, target_url: str, config: Dict[str, Any],
+                handle: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Config to run with, completed in the scheduling process before the engine runs in a pool worker"""
+        return config
+
+    def start(self, target_url: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Start a scan and return its handle"""
+        raise NotImplementedError
+
+    def poll(self, handle: Dict[str, Any]) -> int:
+        """Return scan progress (0-100), advancing the scan's phases if needed"""
+        raise NotImplementedError
+
+    def cancel(self, handle: Dict[str, Any]) -> None:
+        """Stop a running scan"""
+        raise NotImplementedError
+
+    def stream_results(self, handle: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Yield normalized alerts for a finished scan"""
+        raise NotImplementedError
+
+    def run(self, target_url: str, config: Dict[str, Any], handle: Optional[Dict[str, Any]] = None,
+            checkpoint: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Run a scan to completion and return results in the ScanResult.results format
+
+        Args:
+            handle: Handle of an interrupted scan to resume instead of starting a new one
+            checkpoint: Called with the handle on every poll so it can be persisted
+        """
+        checkpoint = checkpoint or (lambda handle: None)
+        if not handle or not self.can_resume(handle):
+            handle = self.start(target_url, config)
+        checkpoint(handle)
+        try:
+            while self.poll(handle) < 100:
+                checkpoint(handle)
+                time.sleep(self.poll_interval)
+        except zap.ScanCancelled:
+            self.cancel(handle)
+            raise
+        alerts = list(self.stream_results(handle))
+        return {
+            'alerts': alerts,
+            'summary': zap.summarize_alerts(alerts),
+            'target_url': target_url,
+            'scan_completed': True
+        }
+
+@register_engine
+class ZAPEngine(ScanEngine):
+    """OWASP ZAP spider + active scan"""
+    name = 'zap'
+    poll_interval = 5
+    options = {
+        'max_children': int_option(1, ZAP_MAX_CHILDREN_LIMIT),
+        'scan_policy': choice_option(ZAP_SCAN_POLICIES),
+        'pipelined': bool,
+    }
+
+    def prepare(self, target_url: str, config: Dict[str, Any],
+                handle: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Pick the instance here: pool workers have their own local-memory cache,
+        # so they would probe ZAP again and not see each other's load reservations
+        from .health import pick_zap_instance
+
+        if handle and handle.get('spider_id'):
+            # A resumed scan stays on the instance it was started on
+            return config
+        return dict(config, api_url=pick_zap_instance(target_url))
+
+    def _scanner(self, handle: Dict[str, Any]) -> zap.ZAPScanner:
+        """Client for the ZAP instance the scan was scheduled on"""
+        return zap.ZAPScanner(handle.get('api_url', zap.ZAP_API))
+
+    def cleanup(self, handle: Dict[str, Any]) -> None:
+        """
+        Drop the scan's context from ZAP now, and its alerts and site tree once no other scan needs them
+
+        ZAP cannot tell apart the alerts of scans of the same host, so while
+        another one runs on the instance the deletion is only recorded on
+        this scan's EngineRun. The last scan of the host deletes the data of
+        every scan recorded that way.
+        """
+        from .health import instances_scanning_host, mark_zap_cleanup_pending, take_pending_zap_cleanups
+
+        scanner = self._scanner(handle)
+        api_url = handle.get('api_url', zap.ZAP_API)
+        context_name = handle.get('context_name')
+        if context_name:
+            try:
+                scanner.remove_context(context_name)
+            except Exception as e:
+                logger.warning(f"Could not clean up ZAP context of {handle['target_url']}: {e}")
+            # Marked before checking for other scans, so two scans finishing together cannot both defer
+            mark_zap_cleanup_pending(context_name)
+
+        if api_url in instances_scanning_host(handle['target_url'], context_name):
+            logger.info(f"Deferring cleanup of ZAP data of {handle['target_url']} to the last scan of the same host")
+            return
+        for target_url in sorted({handle['target_url'], *take_pending_zap_cleanups(api_url, handle['target_url'])}):
+            scanner.cleanup_scan(target_url)
+
+    def cancel(self, handle: Dict[str, Any]) -> None:
+        scanner = self._scanner(handle)
+        for active_id in handle.get('running', []):
+            scanner.stop_active_scan(active_id)
+        if handle.get('active_id'):
+            scanner.stop_active_scan(handle['active_id'])
+        elif handle.get('spider_id'):
+            scanner.stop_spider_scan(handle['spider_id'])
+
+    def run(self, target_url: str, config: Dict[str, Any], handle: Optional[Dict[str, Any]] = None,
+            checkpoint: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        # zap.start_scan drives the whole pipeline: profiles, pipelined phases and resuming from saved IDs
+        state = dict(handle or {}, target_url=target_url)
+        try:
+            results = zap.start_scan(
+                target_url,
+                max_children=config.get('max_children', 10),
+                scan_policy=config.get('scan_policy', 'Default Policy'),
+                profile=config.get('profile'),
+                pipelined=bool(config.get('pipelined', False)),
+                state=state,
+                checkpoint=checkpoint,
+                api_url=config.get('api_url'),
+                cleanup=False
+            )
+        except zap.ScanCancelled:
+            self.cancel(state)
+            self.cleanup(state)
+            raise
+        if state.get('api_url'):
+            self.cleanup(state)
+        results['alerts'] = [dict(alert, source=self.name) for alert in results.get('alerts', [])]
+        return results
+
+class SubprocessEngine(ScanEngine):
+    """Base class for engines that run a local command-line scanner"""
+    executable: str = None
+    output_suffix: str = ''
+    poll_interval = 2
+    options = {'timeout': int_option(1, SUBPROCESS_ENGINE_TIMEOUT)}
+
+    def __init__(self):
+        self._processes: Dict[int, subprocess.Popen] = {}
+        self._stderr: Dict[int, Any] = {}
+
+    def build_command(self, target_url: str, config: Dict[str, Any], output_path: str) -> List[str]:
+        """Command line that scans target_url and writes its report to output_path"""
+        raise NotImplementedError
+
+    def parse_output(self, output: str, target_url: str) -> Iterator[Dict[str, Any]]:
+        """Turn the scanner's report into normalized alerts"""
+        raise NotImplementedError
+
+    def start(self, target_url: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        if target_url.startswith('-'):
+            raise Exception(f"Invalid target {target_url!r}")
+        if not shutil.which(self.executable):
+            raise Exception(f"{self.executable} is not installed or not on PATH")
+
+        fd, output_path = tempfile.mkstemp(prefix=f"openeye-{self.name}-", suffix=self.output_suffix)
+        os.close(fd)
+        # stderr goes to a temp file so a chatty scanner can never fill a pipe and block
+        stderr = tempfile.TemporaryFile()
+        process = subprocess.Popen(
+            self.build_command(target_url, config, output_path),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        self._processes[process.pid] = process
+        self._stderr[process.pid] = stderr
+        return {
+            'target_url': target_url,
+            'pid': process.pid,
+            'output_path': output_path,
+            'started_at': time.time(),
+            'timeout': min(config.get('timeout', SUBPROCESS_ENGINE_TIMEOUT), SUBPROCESS_ENGINE_TIMEOUT),
+        }
+
+    def can_resume(self, handle: Dict[str, Any]) -> bool:
+        # The scanner process died with the worker that started it
+        return handle.get('pid') in self._processes
+
+    def poll(self, handle: Dict[str, Any]) -> int:
+        process = self._processes[handle['pid']]
+        if process.poll() is not None:
+            return 100
+        if time.time() - handle['started_at'] > handle['timeout']:
+            self.cancel(handle)
+            raise Exception(f"{self.executable} timed out after {handle['timeout']} seconds")
+        return 50
+
+    def cancel(self, handle: Dict[str, Any]) -> None:
+        process = self._processes.get(handle['pid'])
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def run(self, *args, **kwargs) -> Dict[str, Any]:
+        try:
+            return super().run(*args, **kwargs)
+        except zap.LeaseLost:
+            # A local process cannot be handed over to the worker that took the scan
+            for pid in list(self._processes):
+                self.cancel({'pid': pid})
+            raise
+
+    def stream_results(self, handle: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        process = self._processes.pop(handle['pid'])
+        stderr_file = self._stderr.pop(handle['pid'])
+        try:
+            with open(handle['output_path'], encoding='utf-8', errors='replace') as fh:
+                output = fh.read()
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='replace')
+        finally:
+            os.unlink(handle['output_path'])
+            stderr_file.close()
+
+        if not output.strip():
+            raise Exception(f"{self.executable} exited with code {process.returncode}: {stderr.strip()[:500]}")
+        yield from self.parse_output(output, handle['target_url'])
+
+@register_engine
+class NmapEngine(SubprocessEngine):
+    """Nmap service detection plus the `vuln` NSE script category"""
+    name = 'nmap'
+    executable = 'nmap'
+    output_suffix = '.xml'
+    options = dict(SubprocessEngine.options, nmap_scripts=choice_option(NMAP_SCRIPT_CATEGORIES))
+
+    def build_command(self, target_url: str, config: Dict[str, Any], output_path: str) -> List[str]:
+        parts = urlsplit(target_url if '://' in target_url else f"//{target_url}")
+        command = [self.executable, '-sV', '-T4', '--script', config.get('nmap_scripts', 'vuln'),
+                   '-oX', output_path]
+        if parts.port:
+            command += ['-p', str(parts.port)]
+        # `--` so a hostname can never be read as an option
+        return command + ['--', parts.hostname]
+
+    def parse_output(self, output: str, target_url: str) -> Iterator[Dict[str, Any]]:
+        root = ET.fromstring(output)
+        for host in root.iter('host'):
+            address = host.find('address')
+            host_addr = address.get('addr') if address is not None else urlsplit(target_url).hostname
+            for port in host.iter('port'):
+                state = port.find('state')
+                if state is None or state.get('state') != 'open':
+                    continue
+                location = f"{host_addr}:{port.get('portid')}/{port.get('protocol')}"
+                service = port.find('service')
+                service_name = ' '.join(
+                    service.get(attr) for attr in ('name', 'product', 'version')
+                    if service is not None and service.get(attr)
+                )
+                yield normalize_alert(
+                    self.name, f"Open port {port.get('portid')}/{port.get('protocol')}",
+                    risk='Informational', url=location, pluginId='nmap-open-port',
+                    description=service_name or 'Unknown service',
+                )
+                for script in port.iter('script'):
+                    script_output = script.get('output', '')
+                    state = NMAP_VULN_STATE.search(script_output)
+                    if not state:
+                        continue
+                    risk = 'Medium' if state.group(1) else 'High'
+                    yield normalize_alert(
+                        self.name, script.get('id'), risk=risk, url=location,
+                        pluginId=f"nmap-{script.get('id')}", description=script_output.strip(),
+                    )
+
+@register_engine
+class NiktoEngine(SubprocessEngine):
+    """Nikto web server scanner"""
+    name = 'nikto'
+    executable = 'nikto'
+    output_suffix = '.json'
+
+    def build_command(self, target_url: str, config: Dict[str, Any], output_path: str) -> List[str]:
+        return [self.executable, '-h', target_url, '-Format', 'json', '-output', output_path,
+                '-ask', 'no', '-nointeractive']
+
+    def parse_output(self, output: str, target_url: str) -> Iterator[Dict[str, Any]]:
+        report = json.loads(output)
+        for host in report if isinstance(report, list) else [report]:
+            for finding in host.get('vulnerabilities', []):
+                # Nikto does not rate its findings; treat them as low risk
+                yield normalize_alert(
+                    self.name, finding.get('msg', 'Nikto finding'), risk='Low',
+                    url=urljoin(target_url, finding.get('url', '')),
+                    method=finding.get('method', ''),
+                    pluginId=f"nikto-{finding.get('id', '')}",
+                    description=finding.get('msg', ''),
+                    reference=finding.get('references', ''),
+                )
+
+@register_engine
+class FakeEngine(ScanEngine):
+    """
+    In-memory engine for tests and local development
+
+    config['alerts'] sets the alerts it reports, config['steps'] the number
+    of polls before it finishes and config['error'] makes it fail.
+    """
+    name = 'fake'
+    poll_interval = 0
+    options = {'alerts': list, 'steps': int_option(1, 1000), 'error': str}
+
+    def start(self, target_url: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        if config.get('error'):
+            raise Exception(config['error'])
+        return {
+            'target_url': target_url,
+            'alerts': config.get('alerts', []),
+            'steps': config.get('steps', 1),
+            'polls': 0,
+            'cancelled': False,
+        }
+
+    def poll(self, handle: Dict[str, Any]) -> int:
+        handle['polls'] += 1
+        return min(100, handle['polls'] * 100 // max(handle['steps'], 1))
+
+    def cancel(self, handle: Dict[str, Any]) -> None:
+        handle['cancelled'] = True
+
+    def stream_results(self, handle: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        for alert in handle['alerts']:
+            fields = {key: value for key, value in alert.items() if key not in ('source', 'name')}
+            yield normalize_alert(self.name, alert.get('name', 'Fake alert'), **fields)
+
+def _engine_checkpoint(scan_id: int, name: str, owner: Optional[str] = None) -> Callable[[Dict[str, Any]], None]:
+    """
+    Persist an engine's handle when it changes and stop the engine if its scan
+    was cancelled, or if `owner` no longer holds the scan's lease
+    """
+    from .models import EngineRun, ScanResult
+
+    last_saved = {}
+
+    def checkpoint(handle: Dict[str, Any]) -> None:
+        status, lease_owner = ScanResult.objects.filter(pk=scan_id).values_list('status', 'lease_owner').first() or (None, None)
+        if status == 'cancelled':
+            raise zap.ScanCancelled(f"Scan {scan_id} was cancelled")
+        if owner is not None and lease_owner != owner:
+            raise zap.LeaseLost(f"Lost lease on scan {scan_id}")
+        snapshot = json.loads(json.dumps(handle))
+        if snapshot != last_saved:
+            EngineRun.objects.filter(scan_id=scan_id, engine=name).update(handle=snapshot)
+            last_saved.clear()
+            last_saved.update(snapshot)
+
+    return checkpoint
+
+def run_engine(name: str, target_url: str, config: Dict[str, Any], scan_id: Optional[int] = None,
+               handle: Optional[Dict[str, Any]] = None, owner: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run one engine to completion, turning failures into an error result
+
+    With a scan_id, the engine's handle and final result are stored on its
+    EngineRun so an interrupted scan can be resumed from `handle`. With an
+    owner, zap.LeaseLost is raised (and nothing stored) once another worker
+    holds the scan's lease.
+    """
+    if scan_id is not None:
+        # Long-lived pool workers may hold a connection the database has since dropped
+        close_old_connections()
+    checkpoint = _engine_checkpoint(scan_id, name, owner) if scan_id is not None else None
+    try:
+        result = get_engine(name).run(target_url, config, handle=handle, checkpoint=checkpoint)
+    except zap.LeaseLost:
+        raise
+    except Exception as e:
+        logger.error(f"{name} scan of {target_url} failed: {e}")
+        result = {
+            'error': str(e),
+            'target_url': target_url,
+            'scan_completed': False
+        }
+
+    if scan_id is not None:
+        _record_engine_result(scan_id, name, result)
+    return result
+
+def _record_engine_result(scan_id: int, name: str, result: Dict[str, Any]) -> None:
+    """Store an engine's final result on its EngineRun"""
+    from .models import EngineRun
+
+    EngineRun.objects.filter(scan_id=scan_id, engine=name).update(
+        status='completed' if result.get('scan_completed') else 'failed',
+        results=result,
+    )
+
+def merge_engine_results(target_url: str, engine_results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-engine results into one alert list with a combined summary"""
+    alerts = []
+    engines = {}
+    for name, result in engine_results.items():
+        alerts.extend(result.get('alerts', []))
+        engines[name] = {
+            'scan_completed': result.get('scan_completed', False),
+            'summary': result.get('summary', {}),
+            'error': result.get('error'),
+        }
+
+    merged = {
+        'alerts': alerts,
+        'summary': zap.summarize_alerts(alerts),
+        'target_url': target_url,
+        'scan_completed': any(engine['scan_completed'] for engine in engines.values()),
+        'engines': engines,
+    }
+    errors = [f"{name}: {engine['error']}" for name, engine in engines.items() if engine['error']]
+    if errors:
+        merged['error'] = '; '.join(errors)
+    return merged
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _init_worker():
+    import django
+    django.setup()
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared engine worker pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned (not forked) workers get their own Django setup and DB connections
+            _pool = ProcessPoolExecutor(
+                max_workers=SCAN_ENGINE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _pool
+
+def run_engines(target_url: str, engine_configs: Dict[str, Dict[str, Any]],
+                parallel: Optional[bool] = None, scan_id: Optional[int] = None,
+                owner: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Scan one target with several engines at once and merge their alerts
+
+    Args:
+        target_url: URL to scan
+        engine_configs: Engine name -> engine config
+        parallel: Run engines in the worker process pool. Defaults to True when
+            more than one engine is requested.
+        scan_id: ScanResult to record engine progress on. Engines that already
+            finished for this scan are not run again, and interrupted ones resume
+            from their saved handle.
+        owner: Lease holder of the scan; engines stop with zap.LeaseLost once
+            another worker holds the lease.
+
+    Returns:
+        Dictionary in the ScanResult.results format, with per-engine status under 'engines'
+    """
+    for name in engine_configs:
+        if name not in ENGINE_REGISTRY:
+            raise ValueError(f"Unknown scan engine '{name}'")
+
+    engine_results = {}
+    handles = {}
+    if scan_id is not None:
+        from .models import EngineRun
+        for name in engine_configs:
+            run, _ = EngineRun.objects.get_or_create(scan_id=scan_id, engine=name)
+            if run.status == 'completed':
+                engine_results[name] = run.results
+            else:
+                handles[name] = run.handle or None
+                if run.status != 'running':
+                    run.status = 'running'
+                    run.save(update_fields=['status', 'updated_at'])
+    pending = {}
+    for name, config in engine_configs.items():
+        if name in engine_results:
+            continue
+        try:
+            pending[name] = get_engine(name).prepare(target_url, config, handles.get(name))
+        except zap.ZAPInstancesBusy:
+            raise
+        except Exception as e:
+            logger.error(f"{name} scan of {target_url} failed: {e}")
+            engine_results[name] = {'error': str(e), 'target_url': target_url, 'scan_completed': False}
+            if scan_id is not None:
+                _record_engine_result(scan_id, name, engine_results[name])
+
+    if parallel is None:
+        parallel = len(pending) > 1
+
+    if not parallel:
+        for name, config in pending.items():
+            engine_results[name] = run_engine(name, target_url, config, scan_id, handles.get(name), owner)
+    else:
+        futures = {
+            _get_pool().submit(run_engine, name, target_url, config, scan_id, handles.get(name), owner): name
+            for name, config in pending.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                engine_results[name] = future.result()
+            except zap.LeaseLost:
+                raise
+            except Exception as e:
+                engine_results[name] = {'error': str(e), 'target_url': target_url, 'scan_completed': False}
+            logger.info(f"{name} scan of {target_url} finished")
+
+    # Keep the requested engine order regardless of completion order
+    return merge_engine_results(target_url, {name: engine_results[name] for name in engine_configs})
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .zap import ZAP_API, ZAPInstancesBusy, ZAPScanner
+
+logger = logging.getLogger(__name__)
+
+# ZAP instances scans can be scheduled on
+ZAP_INSTANCES = [url.rstrip('/') for url in getattr(settings, 'ZAP_INSTANCES', None) or [ZAP_API]]
+ZAP_HEALTH_INTERVAL = getattr(settings, 'ZAP_HEALTH_INTERVAL', 15)
+# Heartbeat requests are abandoned after this many seconds and the instance marked unhealthy
+ZAP_HEALTH_TIMEOUT = getattr(settings, 'ZAP_HEALTH_TIMEOUT', 3.0)
+ZAP_HEALTH_AUTOSTART = getattr(settings, 'ZAP_HEALTH_AUTOSTART', True)
+# Cached status expires if the monitor stops beating, so stale state is never trusted
+ZAP_HEALTH_CACHE_TIMEOUT = ZAP_HEALTH_INTERVAL * 3
+
+_monitor_started = False
+_monitor_lock = threading.Lock()
+
+def _cache_key(api_url: str) -> str:
+    return f"zap_health:{api_url}"
+
+def probe_zap_instance(api_url: str) -> Dict[str, Any]:
+    """Measure one ZAP instance's health, version, response latency and running scans"""
+    scanner = ZAPScanner(api_url, timeout=ZAP_HEALTH_TIMEOUT)
+    status = {
+        'api_url': api_url,
+        'healthy': False,
+        'version': None,
+        'latency_ms': None,
+        'load': 0,
+        'error': None,
+        'checked_at': timezone.now().isoformat(),
+    }
+    try:
+        started = time.monotonic()
+        status['version'] = scanner.get_version()
+        status['latency_ms'] = int((time.monotonic() - started) * 1000)
+        status['load'] = scanner.get_scan_load()
+        status['healthy'] = True
+    except Exception as e:
+        status['error'] = str(e)
+    return status
+
+def refresh_zap_health() -> List[Dict[str, Any]]:
+    """Probe every configured instance and store the results in the cache"""
+    statuses = [probe_zap_instance(api_url) for api_url in ZAP_INSTANCES]
+    cache.set_many({_cache_key(status['api_url']): status for status in statuses}, ZAP_HEALTH_CACHE_TIMEOUT)
+    return statuses
+
+def get_zap_health(api_url: str = ZAP_API) -> Optional[Dict[str, Any]]:
+    """Cached status of one instance, or None if the monitor has not checked it recently"""
+    return cache.get(_cache_key(api_url.rstrip('/')))
+
+def get_all_zap_health() -> List[Dict[str, Any]]:
+    """Cached status of every configured instance; unchecked instances have healthy=None"""
+    cached = cache.get_many([_cache_key(api_url) for api_url in ZAP_INSTANCES])
+    return [
+        cached.get(_cache_key(api_url), {'api_url': api_url, 'healthy': None})
+        for api_url in ZAP_INSTANCES
+    ]
+
+def get_running_zap_scans() -> List[Dict[str, Any]]:
+    """Saved state (api_url, target_url, context_name, ...) of the ZAP scans running now"""
+    from .models import EngineRun
+
+    return list(EngineRun.objects.filter(engine='zap', status='running').values_list('handle', flat=True))
+
+def instances_scanning_host(target_url: str, exclude_context: Optional[str] = None) -> set:
+    """ZAP instances running another scan of target_url's host (scans already cleaning up do not count)"""
+    host = urlsplit(target_url).netloc
+    return {
+        handle.get('api_url', ZAP_API)
+        for handle in get_running_zap_scans()
+        if urlsplit(handle.get('target_url', '')).netloc == host
+        and handle.get('context_name') != exclude_context
+        and not handle.get('cleanup_pending')
+    }
+
+def mark_zap_cleanup_pending(context_name: str) -> None:
+    """Record on a finished scan's EngineRun that its ZAP alerts and site tree still need deleting"""
+    from .models import EngineRun
+
+    for run in EngineRun.objects.filter(engine='zap', handle__context_name=context_name):
+        run.handle = dict(run.handle, cleanup_pending=True)
+        run.save(update_fields=['handle', 'updated_at'])
+
+def take_pending_zap_cleanups(api_url: str, target_url: str) -> List[str]:
+    """Target URLs of scans of target_url's host on api_url whose ZAP data awaits deletion, clearing the mark"""
+    from .models import EngineRun
+
+    host = urlsplit(target_url).netloc
+    targets = []
+    for run in EngineRun.objects.filter(engine='zap', handle__cleanup_pending=True):
+        if run.handle.get('api_url', ZAP_API) != api_url or urlsplit(run.handle.get('target_url', '')).netloc != host:
+            continue
+        targets.append(run.handle['target_url'])
+        run.handle = dict(run.handle, cleanup_pending=False)
+        run.save(update_fields=['handle', 'updated_at'])
+    return targets
+
+def pick_zap_instance(target_url: Optional[str] = None) -> str:
+    """
+    Choose the healthy instance with the fewest running scans (then the lowest latency)
+
+    Only the cached heartbeat state is consulted, so unhealthy or hung
+    instances never delay scheduling. Instances are probed directly only
+    when no heartbeat state exists, e.g. in management commands. Instances
+    already scanning target_url's host are never chosen, because ZAP alerts
+    of overlapping targets cannot be told apart; ZAPInstancesBusy is raised
+    if that leaves none, so the scan can wait for one to finish.
+    """
+    statuses = get_all_zap_health()
+    if all(status['healthy'] is None for status in statuses):
+        statuses = refresh_zap_health()
+
+    healthy = [status for status in statuses if status['healthy']]
+    if not healthy:
+        raise Exception("ZAP is not running or not accessible. Please ensure ZAP is running on the configured port.")
+    if target_url:
+        busy = instances_scanning_host(target_url)
+        healthy = [status for status in healthy if status['api_url'] not in busy]
+        if not healthy:
+            raise ZAPInstancesBusy(f"Every ZAP instance is already scanning {urlsplit(target_url).netloc}")
+    chosen = min(healthy, key=lambda status: (status['load'], status['latency_ms'] or 0))
+
+    # Count the new scan now so scans scheduled before the next heartbeat spread out
+    cache.set(_cache_key(chosen['api_url']), dict(chosen, load=chosen['load'] + 1), ZAP_HEALTH_CACHE_TIMEOUT)
+    return chosen['api_url']
+
+def _monitor_loop():
+    while True:
+        try:
+            for status in refresh_zap_health():
+                if not status['healthy']:
+                    logger.warning(f"ZAP instance {status['api_url']} is unhealthy: {status['error']}")
+        except Exception as e:
+            logger.error(f"ZAP health monitor failed: {e}")
+        time.sleep(ZAP_HEALTH_INTERVAL)
+
+def start_zap_health_monitor():
+    """Start the background heartbeat thread once per process (no-op if disabled)"""
+    global _monitor_started
+    if not ZAP_HEALTH_AUTOSTART:
+        return
+    with _monitor_lock:
+        if _monitor_started:
+            return
+        _monitor_started = True
+    threading.Thread(target=_monitor_loop, name='zap-health-monitor', daemon=True).start()
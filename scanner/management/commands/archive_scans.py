@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from scanner.archive import SCAN_RETENTION_DAYS, archive_scans, get_archive_candidates
+
+
+class Command(BaseCommand):
+    help = "Move results of old scans to the compressed archive store"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=SCAN_RETENTION_DAYS,
+            help=f"Archive scans completed more than this many days ago (default: {SCAN_RETENTION_DAYS})",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help="Number of scans archived per transaction (default: 100)",
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help="Maximum number of scans to archive in this run",
+        )
+        parser.add_argument(
+            '--drop-informational', action='store_true',
+            help="Discard Informational alerts instead of archiving them",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report how many scans would be archived",
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = get_archive_candidates(options['days']).count()
+            self.stdout.write(f"{count} scans older than {options['days']} days would be archived")
+            return
+
+        archived = archive_scans(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            drop_informational=options['drop_informational'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} scans"))
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily trend rollups from the scan history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help="Only rebuild this user's rollups",
+        )
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"Unknown user: {options['username']}")
+            user_id = user.pk
+
+        written = rebuild_rollups(user_id)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows"))
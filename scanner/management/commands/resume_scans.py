@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scanner.recovery import find_orphaned_scans
+from scanner.tasks import run_scan
+
+
+class Command(BaseCommand):
+    help = "Resume scans orphaned by a worker or process restart"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only list the orphaned scans",
+        )
+
+    def handle(self, *args, **options):
+        orphaned = list(find_orphaned_scans())
+        for scan_result in orphaned:
+            self.stdout.write(f"Scan {scan_result.pk}: {scan_result.target_url} ({scan_result.status})")
+        if options['dry_run']:
+            return
+
+        # Run in the foreground so the command owns the leases until the scans finish
+        started = time.monotonic()
+        for scan_result in orphaned:
+            run_scan(scan_result.pk)
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumed {len(orphaned)} scans in {time.monotonic() - started:.0f}s"
+        ))
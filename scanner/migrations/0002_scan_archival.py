@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='archive_key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['archived_at', 'completed_at'], name='scanner_sca_archive_661dbe_idx'),
+        ),
+    ]
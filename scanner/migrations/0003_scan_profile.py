@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0002_scan_archival'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='profile_options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='scan_profile',
+            field=models.CharField(default='balanced', max_length=20),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0003_scan_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngineRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('engine', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('handle', models.JSONField(blank=True, default=dict)),
+                ('results', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='lease_owner',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='scanresult',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='scanner_sca_status_e0771f_idx'),
+        ),
+        migrations.AddField(
+            model_name='enginerun',
+            name='scan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engine_runs', to='scanner.scanresult'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='enginerun',
+            unique_together={('scan', 'engine')},
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0004_resumable_scans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanDiff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('new_count', models.PositiveIntegerField(default=0)),
+                ('fixed_count', models.PositiveIntegerField(default=0)),
+                ('unchanged_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('baseline', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanner.scanresult')),
+                ('scan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='diff', to='scanner.scanresult')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScanAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('plugin_id', models.CharField(blank=True, default='', max_length=50)),
+                ('name', models.CharField(max_length=255)),
+                ('risk', models.CharField(max_length=20)),
+                ('url', models.TextField()),
+                ('param', models.CharField(blank=True, default='', max_length=255)),
+                ('method', models.CharField(blank=True, default='', max_length=10)),
+                ('source', models.CharField(blank=True, default='', max_length=20)),
+                ('scan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='scanner.scanresult')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fingerprint'], name='scanner_sca_fingerp_c08ca9_idx')],
+                'unique_together': {('scan', 'fingerprint')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0005_scan_diff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanalert',
+            name='evidence',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddIndex(
+            model_name='scanalert',
+            index=models.Index(fields=['scan', 'plugin_id', 'risk'], name='scanner_sca_scan_id_d9f3f3_idx'),
+        ),
+    ]
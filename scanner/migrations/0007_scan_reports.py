@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0006_alert_groups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('html', 'HTML'), ('json', 'JSON'), ('csv', 'CSV')], max_length=10)),
+                ('storage_key', models.CharField(max_length=255)),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('compressed_size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('scan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='scanner.scanresult')),
+            ],
+            options={
+                'unique_together': {('scan', 'format')},
+            },
+        ),
+    ]
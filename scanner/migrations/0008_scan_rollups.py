@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0007_scan_reports'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_url', models.URLField(max_length=500)),
+                ('day', models.DateField()),
+                ('scan_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('high_risk', models.PositiveIntegerField(default=0)),
+                ('medium_risk', models.PositiveIntegerField(default=0)),
+                ('low_risk', models.PositiveIntegerField(default=0)),
+                ('informational', models.PositiveIntegerField(default=0)),
+                ('duration_seconds', models.BigIntegerField(default=0)),
+                ('new_count', models.PositiveIntegerField(default=0)),
+                ('fixed_count', models.PositiveIntegerField(default=0)),
+                ('fix_time_seconds', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='scanner_sca_user_id_0c9c82_idx')],
+                'unique_together': {('user', 'target_url', 'day')},
+            },
+        ),
+    ]
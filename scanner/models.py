@@ -2,12 +2,15 @@ from django.db import models
 from django.contrib.auth.models import User
 import json
 
+from .aggregation import group_alerts
+
 class ScanResult(models.Model):
     SCAN_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('running', 'Running'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
     ]
     
     SCAN_TOOL_CHOICES = [
@@ -21,13 +24,23 @@ class ScanResult(models.Model):
     tool = models.CharField(max_length=20, choices=SCAN_TOOL_CHOICES, default='zap')
     status = models.CharField(max_length=20, choices=SCAN_STATUS_CHOICES, default='pending')
     scan_config = models.JSONField(default=dict, blank=True)
+    scan_profile = models.CharField(max_length=20, default='balanced')
+    profile_options = models.JSONField(default=dict, blank=True)
     results = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(null=True, blank=True)
+    archive_key = models.CharField(max_length=255, blank=True, default='')
+    lease_owner = models.CharField(max_length=100, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['archived_at', 'completed_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
     
     def __str__(self):
         return f"{self.tool} scan of {self.target_url} - {self.status}"
@@ -38,30 +51,147 @@ class ScanResult(models.Model):
             return self.completed_at - self.created_at
         return None
     
+    @property
+    def is_archived(self):
+        return self.archived_at is not None
+    
+    def rehydrate(self):
+        """Load archived results back onto this instance (without saving)"""
+        if self.is_archived and self.archive_key:
+            from .archive import load_archived_results
+            self.results = load_archived_results(self.archive_key)
+        return self.results
+    
+    def get_alert_groups(self):
+        """Alerts grouped by rule and risk (computed on the fly for scans stored before grouping)"""
+        if not self.results:
+            return []
+        if 'alert_groups' in self.results:
+            return self.results['alert_groups']
+        return group_alerts(self.results.get('alerts', []))
+    
+    def _get_alerts_with_risk(self, risk):
+        """Raw alerts of one risk level, from the results or from the indexed instances"""
+        if self.results and 'alerts' in self.results:
+            return [alert for alert in self.results['alerts'] if alert.get('risk') == risk]
+        return list(self.alerts.filter(risk=risk).values())
+    
     def get_high_risk_alerts(self):
-        """Get high risk alerts from ZAP results"""
-        if self.tool == 'zap' and self.results:
-            alerts = self.results.get('alerts', [])
-            return [alert for alert in alerts if alert.get('risk') == 'High']
-        return []
+        """Get high risk alerts from scan results"""
+        return self._get_alerts_with_risk('High')
     
     def get_medium_risk_alerts(self):
-        """Get medium risk alerts from ZAP results"""
-        if self.tool == 'zap' and self.results:
-            alerts = self.results.get('alerts', [])
-            return [alert for alert in alerts if alert.get('risk') == 'Medium']
-        return []
+        """Get medium risk alerts from scan results"""
+        return self._get_alerts_with_risk('Medium')
     
     def get_low_risk_alerts(self):
-        """Get low risk alerts from ZAP results"""
-        if self.tool == 'zap' and self.results:
-            alerts = self.results.get('alerts', [])
-            return [alert for alert in alerts if alert.get('risk') == 'Low']
-        return []
+        """Get low risk alerts from scan results"""
+        return self._get_alerts_with_risk('Low')
     
     def get_info_alerts(self):
-        """Get informational alerts from ZAP results"""
-        if self.tool == 'zap' and self.results:
-            alerts = self.results.get('alerts', [])
-            return [alert for alert in alerts if alert.get('risk') == 'Informational']
-        return []
+        """Get informational alerts from scan results"""
+        return self._get_alerts_with_risk('Informational')
+
+class EngineRun(models.Model):
+    """Progress of one scan engine within a scan, persisted so the scan can be resumed"""
+    ENGINE_STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    scan = models.ForeignKey(ScanResult, on_delete=models.CASCADE, related_name='engine_runs')
+    engine = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=ENGINE_STATUS_CHOICES, default='running')
+    handle = models.JSONField(default=dict, blank=True)
+    results = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = [('scan', 'engine')]
+    
+    def __str__(self):
+        return f"{self.engine} for scan {self.scan_id} - {self.status}"
+
+class ScanAlert(models.Model):
+    """One alert of a scan, indexed by a fingerprint that is stable across scans of a target"""
+    scan = models.ForeignKey(ScanResult, on_delete=models.CASCADE, related_name='alerts')
+    fingerprint = models.CharField(max_length=40)
+    plugin_id = models.CharField(max_length=50, blank=True, default='')
+    name = models.CharField(max_length=255)
+    risk = models.CharField(max_length=20)
+    url = models.TextField()
+    param = models.CharField(max_length=255, blank=True, default='')
+    method = models.CharField(max_length=10, blank=True, default='')
+    source = models.CharField(max_length=20, blank=True, default='')
+    evidence = models.TextField(blank=True, default='')
+    
+    class Meta:
+        unique_together = [('scan', 'fingerprint')]
+        indexes = [
+            models.Index(fields=['fingerprint']),
+            models.Index(fields=['scan', 'plugin_id', 'risk']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} at {self.url}"
+
+class ScanDiff(models.Model):
+    """Finding counts of a scan compared with the previous scan of the same target"""
+    scan = models.OneToOneField(ScanResult, on_delete=models.CASCADE, related_name='diff')
+    baseline = models.ForeignKey(ScanResult, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    new_count = models.PositiveIntegerField(default=0)
+    fixed_count = models.PositiveIntegerField(default=0)
+    unchanged_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Diff of scan {self.scan_id} against {self.baseline_id}"
+
+class ScanReport(models.Model):
+    """A pre-rendered, compressed report artifact of a scan, stored under a content-addressed key"""
+    REPORT_FORMAT_CHOICES = [
+        ('html', 'HTML'),
+        ('json', 'JSON'),
+        ('csv', 'CSV'),
+    ]
+    
+    scan = models.ForeignKey(ScanResult, on_delete=models.CASCADE, related_name='reports')
+    format = models.CharField(max_length=10, choices=REPORT_FORMAT_CHOICES)
+    storage_key = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveIntegerField(default=0)
+    compressed_size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = [('scan', 'format')]
+    
+    def __str__(self):
+        return f"{self.get_format_display()} report of scan {self.scan_id}"
+
+class ScanRollup(models.Model):
+    """Daily totals of one user's scans of one target, updated as each scan finishes"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scan_rollups')
+    target_url = models.URLField(max_length=500)
+    day = models.DateField()
+    scan_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    high_risk = models.PositiveIntegerField(default=0)
+    medium_risk = models.PositiveIntegerField(default=0)
+    low_risk = models.PositiveIntegerField(default=0)
+    informational = models.PositiveIntegerField(default=0)
+    duration_seconds = models.BigIntegerField(default=0)
+    new_count = models.PositiveIntegerField(default=0)
+    fixed_count = models.PositiveIntegerField(default=0)
+    fix_time_seconds = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = [('user', 'target_url', 'day')]
+        indexes = [
+            models.Index(fields=['user', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.target_url} on {self.day}"
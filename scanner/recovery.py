@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ScanResult
+from .tasks import SCAN_LEASE_SECONDS, start_scan_thread
+
+logger = logging.getLogger(__name__)
+
+SCAN_REAPER_INTERVAL = getattr(settings, 'SCAN_REAPER_INTERVAL', 60)
+SCAN_REAPER_AUTOSTART = getattr(settings, 'SCAN_REAPER_AUTOSTART', True)
+
+_reaper_started = False
+_reaper_lock = threading.Lock()
+
+def find_orphaned_scans():
+    """
+    Scans no live worker is looking after
+
+    That is running scans whose lease expired (or that predate leases),
+    pending scans that were never picked up within a lease period, and held
+    scans whose hold expired.
+    """
+    now = timezone.now()
+    stale_pending = now - timedelta(seconds=SCAN_LEASE_SECONDS)
+    return ScanResult.objects.filter(
+        Q(status='running', lease_expires_at__lt=now)
+        | Q(status='running', lease_expires_at__isnull=True)
+        | Q(status='pending', lease_expires_at__isnull=True, created_at__lt=stale_pending)
+        | Q(status='pending', lease_expires_at__lt=now)
+    ).order_by('created_at')
+
+def reap_orphaned_scans():
+    """Lease out orphaned scans again; each resumes from its saved engine state"""
+    resumed = 0
+    for scan_result in find_orphaned_scans():
+        logger.info(f"Resuming orphaned scan {scan_result.pk} of {scan_result.target_url}")
+        start_scan_thread(scan_result)
+        resumed += 1
+    return resumed
+
+def _reaper_loop():
+    while True:
+        try:
+            reap_orphaned_scans()
+        except Exception as e:
+            logger.error(f"Scan reaper failed: {e}")
+        finally:
+            connection.close()
+        time.sleep(SCAN_REAPER_INTERVAL)
+
+def start_scan_reaper():
+    """Start the background reaper thread once per process (no-op if disabled)"""
+    global _reaper_started
+    if not SCAN_REAPER_AUTOSTART:
+        return
+    with _reaper_lock:
+        if _reaper_started:
+            return
+        _reaper_started = True
+    threading.Thread(target=_reaper_loop, name='scan-reaper', daemon=True).start()
@@ -0,0 +1,151 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+from typing import Dict, Any, List, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.template.loader import render_to_string
+
+from .aggregation import group_alerts
+from .diff import ensure_scan_indexed
+from .models import ScanReport, ScanResult
+
+logger = logging.getLogger(__name__)
+
+SCAN_REPORT_ROOT = getattr(settings, 'SCAN_REPORT_ROOT', settings.BASE_DIR / 'reports')
+
+report_storage = FileSystemStorage(location=SCAN_REPORT_ROOT)
+
+REPORT_CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+INSTANCE_FIELDS = ('source', 'plugin_id', 'name', 'risk', 'url', 'param', 'method', 'evidence')
+
+def _group_key(source: str, plugin_id: str, name: str, risk: str) -> Tuple[str, str, str]:
+    """Same grouping as aggregation.group_alerts"""
+    return (source, plugin_id or name, risk)
+
+def _report_data(scan_result: ScanResult) -> Dict[str, Any]:
+    """Everything a report needs: scan metadata, alert groups and all alert instances"""
+    results = scan_result.rehydrate() or {}
+    if 'instances' in results:
+        # Archived scans keep their instances (with evidence) in the archive
+        instances = [{field: instance[field] for field in INSTANCE_FIELDS} for instance in results['instances']]
+    else:
+        ensure_scan_indexed(scan_result)
+        instances = list(scan_result.alerts.order_by('url', 'param').values(*INSTANCE_FIELDS))
+
+    groups = [dict(group, instances=[]) for group in scan_result.get_alert_groups()]
+    if not groups and instances:
+        groups = [dict(group, instances=[]) for group in group_alerts(
+            [dict(instance, pluginId=instance['plugin_id']) for instance in instances]
+        )]
+    by_key = {_group_key(group['source'], group['plugin_id'], group['name'], group['risk']): group for group in groups}
+    for instance in instances:
+        group = by_key.get(_group_key(instance['source'], instance['plugin_id'], instance['name'], instance['risk']))
+        if group is not None:
+            group['instances'].append(instance)
+
+    return {
+        'scan': {
+            'id': scan_result.id,
+            'target_url': scan_result.target_url,
+            'tool': scan_result.tool,
+            'tools': scan_result.scan_config.get('tools') or [scan_result.tool],
+            'scan_profile': scan_result.scan_profile,
+            'status': scan_result.status,
+            'created_at': scan_result.created_at.isoformat(),
+            'completed_at': scan_result.completed_at.isoformat() if scan_result.completed_at else None,
+            'duration': str(scan_result.duration) if scan_result.duration else None,
+        },
+        'summary': results.get('summary', {}),
+        'alert_groups': groups,
+        'instances': instances,
+    }
+
+def render_html_report(data: Dict[str, Any]) -> bytes:
+    return render_to_string('scanner/report.html', data).encode('utf-8')
+
+def render_json_report(data: Dict[str, Any]) -> bytes:
+    bundle = {
+        'scan': data['scan'],
+        'summary': data['summary'],
+        'alert_groups': [
+            {key: value for key, value in group.items() if key != 'samples'}
+            for group in data['alert_groups']
+        ],
+    }
+    return json.dumps(bundle, indent=2).encode('utf-8')
+
+def render_csv_report(data: Dict[str, Any]) -> bytes:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(INSTANCE_FIELDS)
+    for instance in data['instances']:
+        writer.writerow([instance[field] for field in INSTANCE_FIELDS])
+    return output.getvalue().encode('utf-8')
+
+REPORT_RENDERERS = {
+    'html': render_html_report,
+    'json': render_json_report,
+    'csv': render_csv_report,
+}
+
+def _report_key(scan_result: ScanResult, report_format: str, sha256: str) -> str:
+    """Content-addressed key: a changed report gets a new key, so stored artifacts never change"""
+    return f"{scan_result.pk // 1000:06d}/{scan_result.pk}/{sha256[:16]}.{report_format}.gz"
+
+def generate_scan_reports(scan_result: ScanResult, formats: List[str] = None) -> List[ScanReport]:
+    """
+    Render, compress and store a scan's reports
+
+    Unchanged reports are not rewritten. Artifacts replaced by a newer
+    version of the same report are deleted.
+
+    Returns:
+        The ScanReport records of the generated formats
+    """
+    data = _report_data(scan_result)
+    reports = []
+    for report_format in formats or REPORT_RENDERERS:
+        content = REPORT_RENDERERS[report_format](data)
+        sha256 = hashlib.sha256(content).hexdigest()
+        key = _report_key(scan_result, report_format, sha256)
+
+        existing = ScanReport.objects.filter(scan=scan_result, format=report_format).first()
+        if existing and existing.sha256 == sha256 and report_storage.exists(existing.storage_key):
+            reports.append(existing)
+            continue
+
+        compressed = gzip.compress(content, mtime=0)
+        if not report_storage.exists(key):
+            key = report_storage.save(key, ContentFile(compressed))
+        report, _ = ScanReport.objects.update_or_create(scan=scan_result, format=report_format, defaults={
+            'storage_key': key,
+            'sha256': sha256,
+            'size': len(content),
+            'compressed_size': len(compressed),
+        })
+        if existing and existing.storage_key != key:
+            report_storage.delete(existing.storage_key)
+        reports.append(report)
+    return reports
+
+def publish_scan_reports(scan_result: ScanResult) -> None:
+    """Generate a finished scan's reports in the worker, logging rather than raising on failure"""
+    try:
+        generate_scan_reports(scan_result)
+    except Exception as e:
+        logger.error(f"Failed to generate reports of scan {scan_result.pk}: {e}")
+
+def open_report(report: ScanReport):
+    """Open a stored report artifact (gzip-compressed bytes)"""
+    return report_storage.open(report.storage_key, 'rb')
@@ -0,0 +1,139 @@
+import logging
+from datetime import timedelta
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Sum
+from django.utils import timezone
+
+from .diff import diff_scans
+from .models import ScanAlert, ScanDiff, ScanResult, ScanRollup
+
+logger = logging.getLogger(__name__)
+
+TREND_DEFAULT_DAYS = getattr(settings, 'TREND_DEFAULT_DAYS', 90)
+
+# Summary keys added up per rollup (same names as the summarize_alerts() keys)
+RISK_FIELDS = ('high_risk', 'medium_risk', 'low_risk', 'informational')
+ROLLUP_FIELDS = (
+    'scan_count', 'completed_count', 'failed_count', *RISK_FIELDS,
+    'duration_seconds', 'new_count', 'fixed_count', 'fix_time_seconds',
+)
+
+def _fix_time_seconds(scan_result: ScanResult, scan_diff: ScanDiff) -> int:
+    """Total time from first detection to this scan over the findings it fixed"""
+    fixed = diff_scans(scan_diff.baseline, scan_result)['fixed'].values('fingerprint')
+    first_seen = ScanAlert.objects.filter(
+        fingerprint__in=fixed,
+        scan__user_id=scan_result.user_id,
+        scan__target_url=scan_result.target_url,
+        scan__created_at__lt=scan_result.created_at,
+    ).values('fingerprint').annotate(first_seen=Min('scan__completed_at'))
+    return sum(
+        int((scan_result.completed_at - row['first_seen']).total_seconds())
+        for row in first_seen if row['first_seen']
+    )
+
+def rollup_deltas(scan_result: ScanResult) -> Dict[str, int]:
+    """What a finished scan adds to its day's rollup"""
+    deltas = {'scan_count': 1}
+    if scan_result.status == 'completed':
+        summary = (scan_result.results or {}).get('summary', {})
+        deltas['completed_count'] = 1
+        deltas.update({field: summary.get(field, 0) for field in RISK_FIELDS})
+        if scan_result.duration:
+            deltas['duration_seconds'] = int(scan_result.duration.total_seconds())
+        scan_diff = ScanDiff.objects.filter(scan=scan_result, baseline__isnull=False).select_related('baseline').first()
+        if scan_diff:
+            deltas['new_count'] = scan_diff.new_count
+            deltas['fixed_count'] = scan_diff.fixed_count
+            if scan_diff.fixed_count:
+                deltas['fix_time_seconds'] = _fix_time_seconds(scan_result, scan_diff)
+    elif scan_result.status == 'failed':
+        deltas['failed_count'] = 1
+    return deltas
+
+def _rollup_day(scan_result: ScanResult):
+    return timezone.localdate(scan_result.completed_at or scan_result.created_at)
+
+def record_scan_rollup(scan_result: ScanResult) -> None:
+    """Add a finished scan to its day's rollup with atomic increments, logging rather than raising on failure"""
+    try:
+        deltas = rollup_deltas(scan_result)
+        rollup, _ = ScanRollup.objects.get_or_create(
+            user_id=scan_result.user_id,
+            target_url=scan_result.target_url,
+            day=_rollup_day(scan_result),
+        )
+        ScanRollup.objects.filter(pk=rollup.pk).update(**{
+            field: F(field) + value for field, value in deltas.items()
+        })
+    except Exception as e:
+        logger.error(f"Failed to update rollup for scan {scan_result.pk}: {e}")
+
+def rebuild_rollups(user_id: Optional[int] = None) -> int:
+    """
+    Recompute rollups from all finished scans, e.g. after a data fix or for existing history
+
+    Returns:
+        Number of rollup rows written
+    """
+    scans = ScanResult.objects.filter(status__in=['completed', 'failed', 'cancelled'])
+    rollups = ScanRollup.objects.all()
+    if user_id is not None:
+        scans = scans.filter(user_id=user_id)
+        rollups = rollups.filter(user_id=user_id)
+
+    totals = {}
+    for scan_result in scans.order_by('pk').iterator(chunk_size=500):
+        row = totals.setdefault((scan_result.user_id, scan_result.target_url, _rollup_day(scan_result)), {})
+        for field, value in rollup_deltas(scan_result).items():
+            row[field] = row.get(field, 0) + value
+
+    with transaction.atomic():
+        rollups.delete()
+        ScanRollup.objects.bulk_create([
+            ScanRollup(user_id=user, target_url=target_url, day=day, **fields)
+            for (user, target_url, day), fields in totals.items()
+        ], batch_size=1000)
+    return len(totals)
+
+def _with_averages(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill missing sums with 0 and add mean scan duration and mean time to fix"""
+    row = dict(row, **{field: row.get(field) or 0 for field in ROLLUP_FIELDS})
+    row['findings'] = sum(row[field] for field in RISK_FIELDS)
+    row['mean_duration_seconds'] = (
+        row['duration_seconds'] // row['completed_count'] if row['completed_count'] else None
+    )
+    row['mean_time_to_fix_hours'] = (
+        round(row['fix_time_seconds'] / row['fixed_count'] / 3600, 1) if row['fixed_count'] else None
+    )
+    return row
+
+def get_trends(user, target_url: Optional[str] = None, days: int = TREND_DEFAULT_DAYS) -> Dict[str, Any]:
+    """Daily and per-target trend totals over the last `days` days, read from the rollups only"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rollups = ScanRollup.objects.filter(user=user, day__gte=since)
+    if target_url:
+        rollups = rollups.filter(target_url=target_url)
+
+    sums = [Sum(field) for field in ROLLUP_FIELDS]
+
+    def unsuffix(row):
+        return {key.removesuffix('__sum'): value for key, value in row.items()}
+
+    return {
+        'days': days,
+        'since': since.isoformat(),
+        'target_url': target_url,
+        'totals': _with_averages(unsuffix(rollups.aggregate(*sums))),
+        'daily': [
+            _with_averages(dict(unsuffix(row), day=row['day'].isoformat()))
+            for row in rollups.values('day').annotate(*sums).order_by('day')
+        ],
+        'targets': [
+            _with_averages(unsuffix(row))
+            for row in rollups.values('target_url').annotate(*sums).order_by('-scan_count__sum')
+        ],
+    }
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_recent_scans
+from .models import ScanReport, ScanResult
+from .reports import report_storage
+
+@receiver(post_save, sender=ScanResult)
+@receiver(post_delete, sender=ScanResult)
+def invalidate_recent_scans_cache(sender, instance, **kwargs):
+    """Any change to a scan may change its owner's recent-scans block"""
+    invalidate_recent_scans(instance.user_id)
+
+@receiver(post_delete, sender=ScanReport)
+def delete_report_artifact(sender, instance, **kwargs):
+    """Remove a deleted report's stored artifact"""
+    report_storage.delete(instance.storage_key)
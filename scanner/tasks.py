@@ -0,0 +1,161 @@
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .aggregation import compact_results
+from .cache import invalidate_recent_scans
+from .diff import ingest_scan_alerts
+from .engines import get_engine, run_engines
+from .models import ScanResult
+from .reports import publish_scan_reports
+from .rollups import record_scan_rollup
+from .zap import LeaseLost, ZAPInstancesBusy
+
+logger = logging.getLogger(__name__)
+
+# A running scan must renew its lease within this many seconds or it is considered orphaned
+SCAN_LEASE_SECONDS = getattr(settings, 'SCAN_LEASE_SECONDS', 120)
+# A scan held back because every ZAP instance is scanning its host is retried after this many seconds
+SCAN_HOLD_SECONDS = getattr(settings, 'SCAN_HOLD_SECONDS', 60)
+
+def get_scan_tools(scan_result):
+    """Engines requested for a scan: scan_config['tools'], or just the scan's tool"""
+    return scan_result.scan_config.get('tools') or [scan_result.tool]
+
+def worker_id():
+    """Identifies the process and thread holding a scan lease"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def claim_scan(scan_id, owner):
+    """
+    Atomically take the lease on a pending scan or a running scan whose lease expired
+
+    Returns:
+        True if this owner now holds the lease
+    """
+    now = timezone.now()
+    return ScanResult.objects.filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now),
+        pk=scan_id,
+        status__in=['pending', 'running'],
+    ).update(
+        status='running',
+        lease_owner=owner,
+        lease_expires_at=now + timedelta(seconds=SCAN_LEASE_SECONDS),
+    ) == 1
+
+def hold_scan(scan_id, owner):
+    """Put a leased scan back to pending; the reaper claims it again once SCAN_HOLD_SECONDS have passed"""
+    return ScanResult.objects.filter(pk=scan_id, lease_owner=owner, status='running').update(
+        status='pending',
+        lease_owner='',
+        lease_expires_at=timezone.now() + timedelta(seconds=SCAN_HOLD_SECONDS),
+    ) == 1
+
+def renew_lease(scan_id, owner):
+    """Extend a held lease; returns False if the lease was lost"""
+    return ScanResult.objects.filter(pk=scan_id, lease_owner=owner, status='running').update(
+        lease_expires_at=timezone.now() + timedelta(seconds=SCAN_LEASE_SECONDS),
+    ) == 1
+
+class LeaseKeeper(threading.Thread):
+    """Renews a scan's lease in the background while its engines run"""
+
+    def __init__(self, scan_id, owner):
+        super().__init__(daemon=True)
+        self.scan_id = scan_id
+        self.owner = owner
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(SCAN_LEASE_SECONDS / 3):
+                if not renew_lease(self.scan_id, self.owner):
+                    logger.warning(f"Lost lease on scan {self.scan_id}")
+                    break
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+
+def run_scan(scan_id):
+    """Run all engines for a scan and store the merged results, resuming any saved progress"""
+    owner = worker_id()
+    if not claim_scan(scan_id, owner):
+        logger.info(f"Scan {scan_id} is already leased by another worker")
+        connection.close()
+        return
+
+    scan_result = ScanResult.objects.get(pk=scan_id)
+    # The claim is a bulk update, so signals did not see the status change
+    invalidate_recent_scans(scan_result.user_id)
+    keeper = LeaseKeeper(scan_id, owner)
+    keeper.start()
+    try:
+        # Engines only see the options they allow, never the raw scan_config
+        results = run_engines(
+            scan_result.target_url,
+            {
+                tool: dict(get_engine(tool).clean_options(scan_result.scan_config), profile=scan_result.profile_options)
+                for tool in get_scan_tools(scan_result)
+            },
+            scan_id=scan_id,
+            owner=owner
+        )
+
+        scan_result.refresh_from_db(fields=['status', 'lease_owner'])
+        if scan_result.lease_owner != owner:
+            raise LeaseLost(f"Lost lease on scan {scan_id}")
+        # Store alerts grouped by rule; individual instances go to the ScanAlert index below
+        scan_result.results = compact_results(results)
+        if scan_result.status != 'cancelled':
+            scan_result.status = 'completed' if results.get('scan_completed') else 'failed'
+        scan_result.completed_at = timezone.now()
+        scan_result.lease_expires_at = None
+        scan_result.save()
+
+        # Per-engine results are merged into the scan now
+        scan_result.engine_runs.update(results={})
+
+        ingest_scan_alerts(scan_result, results.get('alerts', []))
+        if scan_result.status == 'completed':
+            publish_scan_reports(scan_result)
+        record_scan_rollup(scan_result)
+
+    except LeaseLost as e:
+        # The worker now holding the lease finishes the scan and records it
+        logger.warning(f"{e}, leaving the scan to its new owner")
+    except ZAPInstancesBusy as e:
+        logger.info(f"Holding scan {scan_id}: {e}")
+        if hold_scan(scan_id, owner):
+            invalidate_recent_scans(scan_result.user_id)
+    except Exception as e:
+        logger.error(f"Scan {scan_id} failed: {e}")
+        scan_result.refresh_from_db(fields=['status', 'lease_owner'])
+        if scan_result.lease_owner != owner:
+            return
+        if scan_result.status != 'cancelled':
+            scan_result.status = 'failed'
+        scan_result.results = {"error": str(e)}
+        scan_result.completed_at = timezone.now()
+        scan_result.lease_expires_at = None
+        scan_result.save()
+        record_scan_rollup(scan_result)
+    finally:
+        keeper.stop()
+        connection.close()
+
+def start_scan_thread(scan_result):
+    """Run a scan in a background daemon thread"""
+    thread = threading.Thread(target=run_scan, args=(scan_result.pk,))
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -1,3 +1,497 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .aggregation import compact_results, group_alerts
+from .archive import archive_scans, load_archived_results
+from .diff import ingest_scan_alerts
+from .engines import ENGINE_REGISTRY, FakeEngine, ZAPEngine, run_engines
+from .models import EngineRun, ScanResult, ScanRollup
+from .recovery import find_orphaned_scans
+from .tasks import run_scan
+from .zap import ZAP_API, _run_pipelined_phases, _subtree_root, summarize_alerts
+
+class SecondFakeEngine(FakeEngine):
+    name = 'fake2'
+
+class CancellingFakeEngine(FakeEngine):
+    """Cancels its own scan on the first poll, as the cancel API would"""
+    name = 'fake-cancel'
+
+    def poll(self, handle):
+        ScanResult.objects.filter(target_url=handle['target_url']).update(status='cancelled')
+        return super().poll(handle)
+
+class TakenOverFakeEngine(FakeEngine):
+    """Loses its scan's lease to another worker on the first poll, as after a missed renewal"""
+    name = 'fake-taken-over'
+
+    def poll(self, handle):
+        ScanResult.objects.filter(target_url=handle['target_url']).update(lease_owner='other-worker')
+        return super().poll(handle)
+
+def fake_engines():
+    """Register the test engines for the duration of a test"""
+    return mock.patch.dict(ENGINE_REGISTRY, {
+        engine.name: engine for engine in (SecondFakeEngine, CancellingFakeEngine, TakenOverFakeEngine)
+    })
+
+class RunEnginesTests(TestCase):
+    def setUp(self):
+        patcher = fake_engines()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_merges_alerts_of_all_engines(self):
+        results = run_engines('http://example.com/', {
+            'fake': {'alerts': [{'name': 'XSS', 'risk': 'High'}]},
+            'fake2': {'alerts': [{'name': 'Banner', 'risk': 'Low'}, {'name': 'Port', 'risk': 'Informational'}]},
+        }, parallel=False)
+
+        self.assertTrue(results['scan_completed'])
+        self.assertEqual([(alert['source'], alert['name']) for alert in results['alerts']],
+                         [('fake', 'XSS'), ('fake2', 'Banner'), ('fake2', 'Port')])
+        self.assertEqual(results['summary']['total_alerts'], 3)
+        self.assertEqual(results['summary']['high_risk'], 1)
+        self.assertEqual(list(results['engines']), ['fake', 'fake2'])
+        self.assertNotIn('error', results)
+
+    def test_failed_engine_does_not_fail_the_others(self):
+        results = run_engines('http://example.com/', {
+            'fake': {'alerts': [{'name': 'XSS', 'risk': 'High'}]},
+            'fake2': {'error': 'boom'},
+        }, parallel=False)
+
+        self.assertTrue(results['scan_completed'])
+        self.assertEqual(len(results['alerts']), 1)
+        self.assertTrue(results['engines']['fake']['scan_completed'])
+        self.assertFalse(results['engines']['fake2']['scan_completed'])
+        self.assertEqual(results['error'], 'fake2: boom')
+
+    def test_all_engines_failing_fails_the_scan(self):
+        results = run_engines('http://example.com/', {'fake': {'error': 'boom'}}, parallel=False)
+
+        self.assertFalse(results['scan_completed'])
+        self.assertEqual(results['alerts'], [])
+
+    def test_zap_instance_is_picked_before_dispatch(self):
+        with mock.patch('scanner.health.pick_zap_instance', return_value='http://zap-2:8080') as pick, \
+                mock.patch('scanner.zap.start_scan', return_value={'alerts': [], 'scan_completed': True}) as start_scan:
+            run_engines('http://example.com/', {'zap': {}, 'fake': {}}, parallel=False)
+
+        pick.assert_called_once_with('http://example.com/')
+        self.assertEqual(start_scan.call_args.kwargs['api_url'], 'http://zap-2:8080')
+
+    def test_unavailable_zap_fails_only_zap(self):
+        with mock.patch('scanner.health.pick_zap_instance', side_effect=Exception('ZAP is not running')):
+            results = run_engines('http://example.com/', {'zap': {}, 'fake': {}}, parallel=False)
+
+        self.assertTrue(results['scan_completed'])
+        self.assertEqual(results['error'], 'zap: ZAP is not running')
+
+    def test_completed_engines_are_not_run_again(self):
+        user = User.objects.create_user('runner')
+        scan = ScanResult.objects.create(user=user, target_url='http://example.com/', status='running')
+        EngineRun.objects.create(scan=scan, engine='fake', status='completed', results={
+            'alerts': [{'source': 'fake', 'name': 'Stored', 'risk': 'Low'}],
+            'summary': {'total_alerts': 1},
+            'scan_completed': True,
+        })
+
+        results = run_engines('http://example.com/', {
+            'fake': {'alerts': [{'name': 'Rerun', 'risk': 'High'}]},
+            'fake2': {'alerts': [{'name': 'Banner', 'risk': 'Low'}]},
+        }, parallel=False, scan_id=scan.pk)
+
+        self.assertEqual([alert['name'] for alert in results['alerts']], ['Stored', 'Banner'])
+        self.assertEqual(EngineRun.objects.get(scan=scan, engine='fake2').status, 'completed')
+
+class RunScanTests(TransactionTestCase):
+    def setUp(self):
+        patcher = fake_engines()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reports = mock.patch('scanner.tasks.publish_scan_reports')
+        reports.start()
+        self.addCleanup(reports.stop)
+        self.user = User.objects.create_user('scanner')
+
+    def create_scan(self, tools, **scan_config):
+        return ScanResult.objects.create(
+            user=self.user,
+            target_url='http://example.com/',
+            tool=tools[0],
+            status='pending',
+            scan_config=dict(scan_config, tools=tools),
+        )
+
+    def test_completed_scan_stores_grouped_results(self):
+        scan = self.create_scan(['fake'], steps=2, alerts=[
+            {'name': 'XSS', 'risk': 'High', 'url': 'http://example.com/a'},
+            {'name': 'XSS', 'risk': 'High', 'url': 'http://example.com/b'},
+        ])
+
+        run_scan(scan.pk)
+
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, 'completed')
+        self.assertIsNone(scan.lease_expires_at)
+        self.assertEqual(scan.results['summary']['high_risk'], 2)
+        self.assertEqual([group['count'] for group in scan.results['alert_groups']], [2])
+        self.assertEqual(scan.alerts.count(), 2)
+        self.assertEqual(EngineRun.objects.get(scan=scan).status, 'completed')
+
+    def test_failed_engine_fails_the_scan(self):
+        scan = self.create_scan(['fake'], error='boom')
+
+        run_scan(scan.pk)
+
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, 'failed')
+        self.assertEqual(scan.results['error'], 'fake: boom')
+
+    def test_cancelled_scan_stays_cancelled(self):
+        scan = self.create_scan(['fake-cancel'], steps=3, alerts=[{'name': 'XSS', 'risk': 'High'}])
+
+        run_scan(scan.pk)
+
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, 'cancelled')
+        self.assertFalse(scan.results['scan_completed'])
+        self.assertIn('cancelled', scan.results['engines']['fake-cancel']['error'])
+        self.assertEqual(EngineRun.objects.get(scan=scan).status, 'failed')
+
+    def test_resumes_from_saved_handle(self):
+        scan = self.create_scan(['fake'], steps=3, alerts=[{'name': 'Restarted', 'risk': 'Low'}])
+        ScanResult.objects.filter(pk=scan.pk).update(status='running')
+        EngineRun.objects.create(scan=scan, engine='fake', status='running', handle={
+            'target_url': scan.target_url,
+            'alerts': [{'name': 'Resumed', 'risk': 'High'}],
+            'steps': 3,
+            'polls': 2,
+            'cancelled': False,
+        })
+
+        run_scan(scan.pk)
+
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, 'completed')
+        self.assertEqual([group['name'] for group in scan.results['alert_groups']], ['Resumed'])
+        self.assertEqual(EngineRun.objects.get(scan=scan).status, 'completed')
+
+    def test_lost_lease_leaves_scan_to_new_owner(self):
+        scan = self.create_scan(['fake-taken-over'], steps=3, alerts=[{'name': 'XSS', 'risk': 'High'}])
+
+        run_scan(scan.pk)
+
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, 'running')
+        self.assertEqual(scan.lease_owner, 'other-worker')
+        self.assertEqual(scan.results, {})
+        self.assertFalse(ScanRollup.objects.exists())
+        engine_run = EngineRun.objects.get(scan=scan)
+        self.assertEqual(engine_run.status, 'running')
+        self.assertFalse(engine_run.handle['cancelled'])
+
+    def test_failure_keeps_cancelled_status(self):
+        scan = self.create_scan(['fake'], alerts=[{'name': 'XSS', 'risk': 'High'}])
+
+        def cancel_then_fail(scan_result, alerts):
+            ScanResult.objects.filter(pk=scan_result.pk).update(status='cancelled')
+            raise Exception('index failed')
+
+        with mock.patch('scanner.tasks.ingest_scan_alerts', side_effect=cancel_then_fail):
+            run_scan(scan.pk)
+
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, 'cancelled')
+        self.assertEqual(scan.results, {'error': 'index failed'})
+
+    def test_scan_is_held_while_the_only_instance_scans_its_host(self):
+        other = self.create_scan(['zap'])
+        EngineRun.objects.create(scan=other, engine='zap', handle={
+            'api_url': ZAP_API, 'target_url': 'http://example.com/app/', 'context_name': 'openeye-other',
+        })
+        scan = self.create_scan(['zap'])
+        health = [{'api_url': ZAP_API, 'healthy': True, 'load': 1, 'latency_ms': 5}]
+
+        with mock.patch('scanner.health.get_all_zap_health', return_value=health), \
+                mock.patch('scanner.zap.start_scan') as start_scan:
+            run_scan(scan.pk)
+
+        start_scan.assert_not_called()
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, 'pending')
+        self.assertEqual(scan.lease_owner, '')
+        self.assertGreater(scan.lease_expires_at, timezone.now())
+        self.assertNotIn(scan, find_orphaned_scans())
+
+        ScanResult.objects.filter(pk=scan.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIn(scan, find_orphaned_scans())
+
+class ScanDiffTests(TestCase):
+    def test_findings_are_listed_by_severity(self):
+        user = User.objects.create_user('differ')
+        base = ScanResult.objects.create(user=user, target_url='http://example.com/', status='completed',
+                                         results={'alerts': []})
+        head = ScanResult.objects.create(user=user, target_url='http://example.com/', status='completed', results={
+            'alerts': [
+                {'name': name, 'risk': risk, 'url': f'http://example.com/{name}'}
+                for name, risk in [('A', 'Low'), ('B', 'Informational'), ('C', 'High'), ('D', 'Medium')]
+            ],
+        })
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('scanner:scan_diff_api', args=[base.pk, head.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([finding['risk'] for finding in response.json()['new']],
+                         ['High', 'Medium', 'Low', 'Informational'])
+
+    def test_negative_limit_is_rejected(self):
+        user = User.objects.create_user('differ')
+        base = ScanResult.objects.create(user=user, target_url='http://example.com/', status='completed',
+                                         results={'alerts': []})
+        head = ScanResult.objects.create(user=user, target_url='http://example.com/', status='completed',
+                                         results={'alerts': []})
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('scanner:scan_diff_api', args=[base.pk, head.pk]), {'limit': -1})
+
+        self.assertEqual(response.status_code, 400)
+
+class AlertInstanceTests(TestCase):
+    alerts = [
+        {'pluginId': '40012', 'name': 'XSS', 'risk': 'High', 'url': 'http://example.com/a?q=1', 'param': 'q', 'evidence': '<script>'},
+        # Same finding again with another query value: one instance
+        {'pluginId': '40012', 'name': 'XSS', 'risk': 'High', 'url': 'http://example.com/a?q=2', 'param': 'q', 'evidence': '<script>'},
+        {'pluginId': '40012', 'name': 'XSS', 'risk': 'High', 'url': 'http://example.com/b', 'param': 'q', 'evidence': '<img>'},
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user('alerts')
+        self.client.force_login(self.user)
+        self.scan = ScanResult.objects.create(
+            user=self.user, target_url='http://example.com/', status='completed',
+            completed_at=timezone.now() - timedelta(days=365), results={'alerts': self.alerts},
+        )
+        ingest_scan_alerts(self.scan, self.alerts)
+
+    def get_instances(self):
+        response = self.client.get(reverse('scanner:get_alert_instances', args=[self.scan.pk]),
+                                   {'plugin_id': '40012', 'risk': 'High'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_group_count_matches_instances(self):
+        groups = group_alerts(self.alerts)
+
+        self.assertEqual([group['count'] for group in groups], [2])
+        self.assertEqual(self.get_instances()['count'], 2)
+
+    def test_summary_counts_deduplicated_findings(self):
+        summary = compact_results({'alerts': self.alerts, 'summary': summarize_alerts(self.alerts)})['summary']
+
+        self.assertEqual(summary['total_alerts'], 2)
+        self.assertEqual(summary['high_risk'], 2)
+
+    def test_archiving_moves_evidence_to_the_archive(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = FileSystemStorage(location=directory.name)
+        with mock.patch('scanner.archive.archive_storage', storage):
+            self.assertEqual(archive_scans(), 1)
+
+            self.assertEqual(set(self.scan.alerts.values_list('evidence', flat=True)), {''})
+            self.assertEqual(self.scan.alerts.count(), 2)
+            instances = self.get_instances()['instances']
+
+        self.assertEqual([instance['evidence'] for instance in instances], ['<script>', '<img>'])
+
+    def test_archived_evidence_is_read_once_while_paging(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with mock.patch('scanner.archive.archive_storage', FileSystemStorage(location=directory.name)):
+            archive_scans()
+            with mock.patch('scanner.archive.load_archived_results', wraps=load_archived_results) as load:
+                for _ in range(3):
+                    self.assertEqual(self.get_instances()['instances'][0]['evidence'], '<script>')
+
+        self.assertEqual(load.call_count, 1)
+
+class ZAPCleanupTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('zap')
+        self.handles = {}
+        for name in ('first', 'second'):
+            scan = ScanResult.objects.create(user=user, target_url=f'http://example.com/{name}/', status='running')
+            self.handles[name] = {
+                'api_url': 'http://zap-1:8080',
+                'target_url': scan.target_url,
+                'context_name': f'openeye-{name}',
+                'spider_id': '1',
+            }
+            EngineRun.objects.create(scan=scan, engine='zap', handle=self.handles[name])
+        patcher = mock.patch('scanner.zap.ZAPScanner')
+        self.scanner = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_last_scan_of_a_host_deletes_the_data_of_all(self):
+        ZAPEngine().cleanup(self.handles['first'])
+
+        self.scanner.remove_context.assert_called_once_with('openeye-first')
+        self.scanner.cleanup_scan.assert_not_called()
+        first = EngineRun.objects.get(handle__context_name='openeye-first')
+        self.assertTrue(first.handle['cleanup_pending'])
+
+        EngineRun.objects.filter(pk=first.pk).update(status='completed')
+        ZAPEngine().cleanup(self.handles['second'])
+
+        self.assertEqual([call.args for call in self.scanner.cleanup_scan.call_args_list],
+                         [('http://example.com/first/',), ('http://example.com/second/',)])
+        self.assertFalse(EngineRun.objects.filter(handle__cleanup_pending=True).exists())
+
+    def test_scans_finishing_together_do_not_both_defer(self):
+        ZAPEngine().cleanup(self.handles['first'])
+        # The first scan's EngineRun is still running, but it only waits for its cleanup
+        ZAPEngine().cleanup(self.handles['second'])
+
+        self.assertEqual(self.scanner.cleanup_scan.call_count, 2)
+        self.assertEqual(self.scanner.remove_context.call_count, 2)
+
+class ScanReportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch('scanner.reports.report_storage', FileSystemStorage(location=directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user('reporter')
+        self.client.force_login(user)
+        alerts = [{'name': 'XSS', 'risk': 'High', 'url': 'http://example.com/a'}]
+        self.scan = ScanResult.objects.create(user=user, target_url='http://example.com/', status='completed',
+                                              results={'alerts': alerts})
+        ingest_scan_alerts(self.scan, alerts)
+        self.url = reverse('scanner:scan_report', args=[self.scan.pk, 'html'])
+
+    def test_html_report_is_served_inline_under_its_own_name(self):
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Disposition'], f'inline; filename="openeye-scan-{self.scan.pk}.html"')
+
+    def test_each_encoding_has_its_own_etag(self):
+        gzipped = self.client.get(self.url, headers={'Accept-Encoding': 'gzip'})
+        plain = self.client.get(self.url)
+
+        self.assertNotEqual(gzipped['ETag'], plain['ETag'])
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': gzipped['ETag']}).status_code, 200)
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': plain['ETag']}).status_code, 304)
+
+class ScanStatusTests(TestCase):
+    def test_cancelled_scan_reports_cancelled_phase(self):
+        user = User.objects.create_user('status')
+        scan = ScanResult.objects.create(user=user, target_url='http://example.com/', status='cancelled')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('scanner:get_scan_status', args=[scan.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['status'], response.json()['phase']), ('cancelled', 'cancelled'))
+
+class StartScanApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('starter')
+        self.client.force_login(self.user)
+
+    def start_scan(self, scan_config):
+        with mock.patch('scanner.views.start_scan_thread'):
+            return self.client.post(reverse('scanner:start_scan_api'), {
+                'target_url': 'http://example.com/',
+                'tool': 'zap',
+                'scan_config': scan_config,
+            }, content_type='application/json')
+
+    def test_invalid_overrides_are_rejected(self):
+        response = self.start_scan({'profile': 'balanced', 'overrides': ['max_children']})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'overrides must be an object')
+        self.assertFalse(ScanResult.objects.exists())
+
+    def test_invalid_scan_config_is_rejected(self):
+        self.assertEqual(self.start_scan(['profile']).status_code, 400)
+        self.assertEqual(self.start_scan({'profile': ['fast']}).status_code, 400)
+
+    def test_valid_overrides_are_applied(self):
+        response = self.start_scan({'profile': 'balanced', 'overrides': {'delay_in_ms': 50}})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ScanResult.objects.get().profile_options['delay_in_ms'], 50)
+
+class PipelinedScanTests(TestCase):
+    def test_subtree_root_is_relative_to_the_target(self):
+        cases = [
+            ('http://host/app/sub/x', 'http://host/app/sub/', None),
+            ('http://host/app/sub/x/y', 'http://host/app/sub/', 'http://host/app/sub/x/'),
+            ('http://host/app/sub/x', 'http://host/app/', 'http://host/app/sub/'),
+            ('http://host/app/sub/x', 'http://host/app', 'http://host/app/sub/'),
+            ('http://host/app/page', 'http://host/app/', None),
+            ('http://host/app', 'http://host/app/', None),
+            ('http://host/a/b', 'http://host/', 'http://host/a/'),
+            ('http://host/index.html', 'http://host/', None),
+        ]
+        for url, target_url, expected in cases:
+            with self.subTest(url=url, target_url=target_url):
+                self.assertEqual(_subtree_root(url, target_url), expected)
+
+    def run_pipelined(self, target_url, spider_results, failing_roots=()):
+        scanner = mock.Mock()
+        scanner.get_spider_status.return_value = 100
+        scanner.get_spider_results.return_value = spider_results
+        scanner.get_active_scan_status.return_value = 100
+        started = []
+
+        def start_active_scan(url, scan_policy, recurse=True, context_id=None):
+            if url in failing_roots:
+                raise Exception('URL not in context')
+            started.append((url, recurse))
+            return str(len(started))
+
+        scanner.start_active_scan.side_effect = start_active_scan
+        with mock.patch('scanner.zap.time.sleep'):
+            _run_pipelined_phases(scanner, target_url, 10, 'Default Policy', {}, {}, lambda state: None)
+        return started
+
+    def test_subtrees_below_the_target_are_scanned_and_the_rest_caught_up(self):
+        started = self.run_pipelined('http://host/app/', [
+            'http://host/app/',
+            'http://host/app/page',
+            'http://host/app/sub/a',
+            'http://host/app/sub/b',
+            'http://host/app/other/c',
+            'http://host/elsewhere/d',
+            'http://other-host/app/sub/e',
+        ])
+
+        self.assertEqual(sorted(url for url, recurse in started if recurse),
+                         ['http://host/app/other/', 'http://host/app/sub/'])
+        self.assertEqual(sorted(url for url, recurse in started if not recurse),
+                         ['http://host/app/', 'http://host/app/page'])
+
+    def test_failed_subtree_falls_back_to_catch_up(self):
+        started = self.run_pipelined('http://host/app/', [
+            'http://host/app/sub/a',
+            'http://host/app/sub/b',
+        ], failing_roots=['http://host/app/sub/'])
+
+        self.assertEqual(sorted(started), [
+            ('http://host/app/', False), ('http://host/app/sub/a', False), ('http://host/app/sub/b', False),
+        ])
@@ -7,12 +7,19 @@ app_name = 'scanner'
 urlpatterns = [
     path("", views.scan, name="scan"),  # This will handle /scan/
     path("<int:scan_id>/", views.scan_results, name="scan_results"),  # This will handle /scan/123/
+    path("<int:scan_id>/report/<str:report_format>/", views.scan_report, name="scan_report"),
     path("history/", views.scan_history, name="scan_history"),
+    path("trends/", views.trends, name="trends"),
+    path("diff/<int:base_id>/<int:head_id>/", views.scan_diff, name="scan_diff"),
     
     # API endpoints
     path("api/start-scan/", views.start_scan_api, name="start_scan_api"),
     path("api/scan/<int:scan_id>/status/", views.get_scan_status, name="get_scan_status"),
+    path("api/scan/<int:scan_id>/progress-stream/", views.scan_progress_stream, name="scan_progress_stream"),
     path("api/scan/<int:scan_id>/results/", views.get_scan_results, name="get_scan_results"),
+    path("api/scan/<int:scan_id>/alerts/", views.get_alert_instances, name="get_alert_instances"),
     path("api/scan/<int:scan_id>/cancel/", views.cancel_scan, name="cancel_scan"),
+    path("api/diff/<int:base_id>/<int:head_id>/", views.scan_diff_api, name="scan_diff_api"),
+    path("api/trends/", views.trends_api, name="trends_api"),
     path("api/zap-status/", views.check_zap_status, name="check_zap_status"),
 ]
\ No newline at end of file
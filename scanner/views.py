@@ -1,14 +1,42 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.core.paginator import Paginator
+from django.db.models import Case, IntegerField, Value, When
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.core.validators import URLValidator
+from asgiref.sync import sync_to_async
+import asyncio
+import gzip
 import json
-import threading
-from .models import ScanResult
-from .zap import start_scan, ZAPScanner
+import logging
+from .aggregation import RISK_ORDER, compact_results
+from .archive import load_archived_evidence
+from .cache import render_recent_scans
+from .diff import diff_scans, ensure_scan_indexed
+from .engines import ENGINE_REGISTRY, get_engine
+from .health import get_all_zap_health
+from .models import ScanResult, ScanDiff, ScanReport, ScanRollup
+from .reports import REPORT_CONTENT_TYPES, REPORT_RENDERERS, generate_scan_reports, open_report
+from .rollups import TREND_DEFAULT_DAYS, get_trends
+from .tasks import start_scan_thread
+from .zap import resolve_scan_profile, AsyncZAPScanner, DEFAULT_SCAN_PROFILE
+
+logger = logging.getLogger(__name__)
+
+# Seconds between events on the scan progress stream
+PROGRESS_STREAM_INTERVAL = getattr(settings, 'PROGRESS_STREAM_INTERVAL', 2)
+
+# Maximum findings listed per category by the diff API and page
+DIFF_LIST_LIMIT = getattr(settings, 'DIFF_LIST_LIMIT', 500)
+
+# Alert instances per page of the alert instances API
+ALERT_INSTANCES_PAGE_SIZE = getattr(settings, 'ALERT_INSTANCES_PAGE_SIZE', 50)
 
 def index(request):
     """Main scanner view - requires login"""
@@ -24,47 +52,185 @@ def index(request):
 
 def home(request):
     """Home page view"""
-    recent_scans = []
     if request.user.is_authenticated:
-        recent_scans = ScanResult.objects.filter(user=request.user)[:6]
         cognito_user_info = request.session.get('cognito_user_info', {})
         user_email = cognito_user_info.get('email', request.user.email)
         return render(request, 'home.html', {
             'user': request.user,
             'user_email': user_email,
             'cognito_user_info': cognito_user_info,
-            'recent_scans': recent_scans
+            'recent_scans_html': render_recent_scans(request.user.pk, 'home')
         })
     else:
-        return render(request, 'home.html', {'recent_scans': recent_scans})
+        return render(request, 'home.html')
 
 @login_required
 def scan(request):
     """Scan page view - requires authentication"""
-    recent_scans = ScanResult.objects.filter(user=request.user)[:6]
     cognito_user_info = request.session.get('cognito_user_info', {})
     user_email = cognito_user_info.get('email', request.user.email)
     return render(request, 'scanner/scan.html', {
         'user': request.user,
         'user_email': user_email,
         'cognito_user_info': cognito_user_info,
-        'recent_scans': recent_scans
+        'recent_scans_html': render_recent_scans(request.user.pk, 'scan')
     })
 
 @login_required
 def scan_results(request, scan_id):
     """View scan results"""
     scan_result = get_object_or_404(ScanResult, id=scan_id, user=request.user)
+    scan_result.rehydrate()
+    scan_diff = ScanDiff.objects.filter(scan=scan_result, baseline__isnull=False).first()
     cognito_user_info = request.session.get('cognito_user_info', {})
     user_email = cognito_user_info.get('email', request.user.email)
     
     return render(request, 'scanner/results.html', {
         'scan': scan_result,
+        'scan_diff': scan_diff,
+        'alert_groups': scan_result.get_alert_groups(),
+        'report_links': _report_links(scan_result),
         'user': request.user,
         'user_email': user_email,
         'cognito_user_info': cognito_user_info
     })
 
+def _report_links(scan_result):
+    """(format, version) of each report; the version is the content hash prefix once generated"""
+    versions = {report.format: report.sha256[:16] for report in scan_result.reports.all()}
+    return [(report_format, versions.get(report_format, '')) for report_format in REPORT_RENDERERS]
+
+@login_required
+def scan_report(request, scan_id, report_format):
+    """Serve a pre-rendered report artifact with immutable cache headers"""
+    scan_result = get_object_or_404(ScanResult, id=scan_id, user=request.user)
+    if report_format not in REPORT_RENDERERS:
+        raise Http404("Unknown report format")
+    
+    report = ScanReport.objects.filter(scan=scan_result, format=report_format).first()
+    if report is None:
+        if scan_result.status != 'completed':
+            raise Http404("Report not available")
+        # Scans that finished before reports were generated by the worker
+        report = generate_scan_reports(scan_result, [report_format])[0]
+    
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    # The compressed and plain bodies differ, so each encoding gets its own ETag
+    etag = f'"{report.sha256}-gzip"' if gzipped else f'"{report.sha256}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    elif gzipped:
+        # The artifact is already compressed; send it as is
+        response = FileResponse(open_report(report), content_type=REPORT_CONTENT_TYPES[report_format])
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = report.compressed_size
+    else:
+        with open_report(report) as fh:
+            response = HttpResponse(gzip.decompress(fh.read()), content_type=REPORT_CONTENT_TYPES[report_format])
+    
+    # Always set: FileResponse would otherwise name the stored artifact (<hash>.html.gz)
+    disposition = 'inline' if report_format == 'html' else 'attachment'
+    response['Content-Disposition'] = f'{disposition}; filename="openeye-scan-{scan_result.id}.{report_format}"'
+    response['ETag'] = etag
+    if request.GET.get('v') == report.sha256[:16]:
+        # Versioned links name one exact artifact, which never changes
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+def _get_scan_diff(request, base_id, head_id, limit):
+    """Load two of the user's scans and compare their indexed findings"""
+    base = get_object_or_404(ScanResult, id=base_id, user=request.user)
+    head = get_object_or_404(ScanResult, id=head_id, user=request.user)
+    ensure_scan_indexed(base)
+    ensure_scan_indexed(head)
+    
+    diff = diff_scans(base, head)
+    fields = ('fingerprint', 'plugin_id', 'name', 'risk', 'url', 'param', 'method', 'source')
+    severity = Case(
+        *[When(risk=risk, then=Value(rank)) for risk, rank in RISK_ORDER.items()],
+        default=Value(len(RISK_ORDER)),
+        output_field=IntegerField(),
+    )
+    return base, head, {
+        'counts': {category: findings.count() for category, findings in diff.items()},
+        **{category: list(findings.order_by(severity, 'name').values(*fields)[:limit])
+           for category, findings in diff.items()},
+    }
+
+@login_required
+def scan_diff(request, base_id, head_id):
+    """Compare the findings of two scans"""
+    base, head, diff = _get_scan_diff(request, base_id, head_id, DIFF_LIST_LIMIT)
+    cognito_user_info = request.session.get('cognito_user_info', {})
+    user_email = cognito_user_info.get('email', request.user.email)
+    
+    return render(request, 'scanner/diff.html', {
+        'base': base,
+        'head': head,
+        'diff': diff,
+        'diff_sections': [
+            (title, diff[category], diff['counts'][category])
+            for title, category in [('New', 'new'), ('Fixed', 'fixed'), ('Unchanged', 'unchanged')]
+        ],
+        'user': request.user,
+        'user_email': user_email,
+        'cognito_user_info': cognito_user_info
+    })
+
+@login_required
+def scan_diff_api(request, base_id, head_id):
+    """New, fixed and unchanged findings of scan head_id relative to scan base_id"""
+    try:
+        limit = min(int(request.GET.get('limit', DIFF_LIST_LIMIT)), DIFF_LIST_LIMIT)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    if limit < 0:
+        return JsonResponse({"error": "limit must not be negative"}, status=400)
+    
+    base, head, diff = _get_scan_diff(request, base_id, head_id, limit)
+    return JsonResponse({
+        "base_scan_id": base.id,
+        "head_scan_id": head.id,
+        "target_url": head.target_url,
+        **diff
+    })
+
+def _get_trends(request):
+    """Trends for the ?target_url= and ?days= query parameters"""
+    try:
+        days = max(1, min(int(request.GET.get('days', TREND_DEFAULT_DAYS)), 366))
+    except ValueError:
+        days = TREND_DEFAULT_DAYS
+    return get_trends(request.user, request.GET.get('target_url') or None, days)
+
+@login_required
+def trends(request):
+    """Security trends page"""
+    trend_data = _get_trends(request)
+    max_findings = max([row['findings'] for row in trend_data['daily']] or [0]) or 1
+    for row in trend_data['daily']:
+        row['bar_pct'] = row['findings'] * 100 // max_findings
+    
+    cognito_user_info = request.session.get('cognito_user_info', {})
+    user_email = cognito_user_info.get('email', request.user.email)
+    
+    return render(request, 'scanner/trends.html', {
+        'trends': trend_data,
+        'all_targets': ScanRollup.objects.filter(user=request.user).values_list('target_url', flat=True).distinct().order_by('target_url'),
+        'day_choices': [7, 30, 90, 180, 365],
+        'user': request.user,
+        'user_email': user_email,
+        'cognito_user_info': cognito_user_info
+    })
+
+@login_required
+def trends_api(request):
+    """Daily and per-target risk counts, scan volume, durations and mean time to fix"""
+    return JsonResponse(_get_trends(request))
+
 @login_required
 def scan_history(request):
     """View scan history"""
@@ -92,10 +258,36 @@ def start_scan_api(request):
         data = json.loads(request.body)
         target_url = data.get('target_url')
         tool = data.get('tool', 'zap')
-        scan_config = data.get('scan_config', {})
+        scan_config = data.get('scan_config') or {}
         
+        if not isinstance(scan_config, dict):
+            return JsonResponse({"error": "scan_config must be an object"}, status=400)
         if not target_url:
             return JsonResponse({"error": "target_url is required"}, status=400)
+        try:
+            URLValidator(schemes=['http', 'https'])(target_url)
+        except ValidationError:
+            return JsonResponse({"error": "target_url must be a valid http(s) URL"}, status=400)
+        
+        # Several engines can scan the same target: {"tools": ["zap", "nikto"]}
+        tools = data.get('tools') or [tool]
+        available_tools = [choice for choice, _ in ScanResult.SCAN_TOOL_CHOICES if choice in ENGINE_REGISTRY]
+        unknown_tools = [name for name in tools if name not in available_tools]
+        if unknown_tools:
+            return JsonResponse({"error": f"Unsupported tool(s): {', '.join(unknown_tools)}"}, status=400)
+        tool = tools[0]
+        
+        # Resolve the performance profile and any per-scan overrides
+        profile_name = scan_config.get('profile') or DEFAULT_SCAN_PROFILE
+        try:
+            profile = resolve_scan_profile(profile_name, scan_config.get('overrides'))
+            # Keep only the options the chosen engines allow
+            options = {}
+            for name in tools:
+                options.update(get_engine(name).clean_options(scan_config))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        scan_config = dict(options, tools=tools, profile=profile_name, overrides=scan_config.get('overrides') or {})
         
         # Create scan record
         scan_result = ScanResult.objects.create(
@@ -103,40 +295,13 @@ def start_scan_api(request):
             target_url=target_url,
             tool=tool,
             status='pending',
-            scan_config=scan_config
+            scan_config=scan_config,
+            scan_profile=profile_name,
+            profile_options=profile
         )
         
         # Start scan in background thread
-        def run_scan():
-            try:
-                scan_result.status = 'running'
-                scan_result.save()
-                
-                if tool == 'zap':
-                    results = start_scan(
-                        target_url,
-                        max_children=scan_config.get('max_children', 10),
-                        scan_policy=scan_config.get('scan_policy', 'Default Policy')
-                    )
-                else:
-                    # Placeholder for other tools
-                    results = {"error": f"Tool {tool} not implemented yet"}
-                
-                scan_result.results = results
-                scan_result.status = 'completed' if results.get('scan_completed') else 'failed'
-                scan_result.completed_at = timezone.now()
-                scan_result.save()
-                
-            except Exception as e:
-                scan_result.status = 'failed'
-                scan_result.results = {"error": str(e)}
-                scan_result.completed_at = timezone.now()
-                scan_result.save()
-        
-        # Start background thread
-        thread = threading.Thread(target=run_scan)
-        thread.daemon = True
-        thread.start()
+        start_scan_thread(scan_result)
         
         return JsonResponse({
             "scan_id": scan_result.id,
@@ -149,11 +314,8 @@ def start_scan_api(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
-@login_required
-def get_scan_status(request, scan_id):
-    """Get scan status and progress"""
-    scan_result = get_object_or_404(ScanResult, id=scan_id, user=request.user)
-    
+def _scan_status_payload(scan_result):
+    """Build the status/progress payload shared by the polling and streaming endpoints"""
     # Calculate progress based on status and time elapsed
     progress = 0
     phase = 'pending'
@@ -181,43 +343,115 @@ def get_scan_status(request, scan_id):
     elif scan_result.status == 'failed':
         progress = 0
         phase = 'failed'
+    elif scan_result.status == 'cancelled':
+        progress = 0
+        phase = 'cancelled'
     
-    return JsonResponse({
+    return {
         "scan_id": scan_result.id,
         "status": scan_result.status,
         "progress": int(progress),
         "phase": phase,
         "target_url": scan_result.target_url,
         "tool": scan_result.tool,
+        "scan_profile": scan_result.scan_profile,
         "created_at": scan_result.created_at.isoformat(),
         "updated_at": scan_result.updated_at.isoformat(),
         "completed_at": scan_result.completed_at.isoformat() if scan_result.completed_at else None,
         "duration": str(scan_result.duration) if scan_result.duration else None
-    })
+    }
+
+@login_required
+async def get_scan_status(request, scan_id):
+    """Get scan status and progress"""
+    user = await request.auser()
+    scan_result = await aget_object_or_404(ScanResult, id=scan_id, user=user)
+    return JsonResponse(_scan_status_payload(scan_result))
+
+@login_required
+async def scan_progress_stream(request, scan_id):
+    """Stream scan status and progress as server-sent events until the scan finishes"""
+    # WSGI servers buffer the whole stream, so clients fall back to polling the status API there
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Progress stream requires an ASGI server"}, status=501)
+    
+    user = await request.auser()
+    scan_result = await aget_object_or_404(ScanResult, id=scan_id, user=user)
+    
+    async def event_stream(scan_result):
+        while True:
+            yield f"data: {json.dumps(_scan_status_payload(scan_result))}\n\n"
+            if scan_result.status not in ['pending', 'running']:
+                break
+            await asyncio.sleep(PROGRESS_STREAM_INTERVAL)
+            scan_result = await ScanResult.objects.aget(id=scan_id)
+    
+    response = StreamingHttpResponse(event_stream(scan_result), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
-def get_scan_results(request, scan_id):
+async def get_scan_results(request, scan_id):
     """Get scan results"""
-    scan_result = get_object_or_404(ScanResult, id=scan_id, user=request.user)
+    user = await request.auser()
+    scan_result = await aget_object_or_404(ScanResult, id=scan_id, user=user)
     
     if scan_result.status != 'completed':
         return JsonResponse({"error": "Scan not completed yet"}, status=400)
     
+    await sync_to_async(scan_result.rehydrate)()
+    results = compact_results({
+        key: value for key, value in (scan_result.results or {}).items() if key != 'instances'
+    })
     return JsonResponse({
         "scan_id": scan_result.id,
         "target_url": scan_result.target_url,
         "tool": scan_result.tool,
-        "results": scan_result.results,
-        "summary": scan_result.results.get('summary', {}) if scan_result.results else {}
+        "results": results,
+        "summary": results.get('summary', {})
     })
 
 @login_required
-def check_zap_status(request):
-    """Check if ZAP is running and accessible"""
+def get_alert_instances(request, scan_id):
+    """Paginated instances of one alert group, selected by plugin_id (or name), risk and source"""
+    scan_result = get_object_or_404(ScanResult, id=scan_id, user=request.user)
+    ensure_scan_indexed(scan_result)
+    
+    instances = scan_result.alerts.order_by('url', 'param')
+    for field in ('plugin_id', 'name', 'risk', 'source'):
+        if field in request.GET:
+            instances = instances.filter(**{field: request.GET[field]})
+    
+    paginator = Paginator(instances.values('fingerprint', 'url', 'param', 'method', 'evidence'), ALERT_INSTANCES_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page = list(page_obj)
+    # Archiving moves evidence from the index to the archive
+    archived_evidence = {}
+    if scan_result.is_archived and any(not instance['evidence'] for instance in page):
+        archived_evidence = load_archived_evidence(scan_result)
+    for instance in page:
+        fingerprint = instance.pop('fingerprint')
+        instance['evidence'] = instance['evidence'] or archived_evidence.get(fingerprint, '')
+    return JsonResponse({
+        "scan_id": scan_result.id,
+        "count": paginator.count,
+        "page": page_obj.number,
+        "num_pages": paginator.num_pages,
+        "instances": page
+    })
+
+@login_required
+async def check_zap_status(request):
+    """Check if ZAP is running and accessible, from the health monitor's cached state"""
     try:
-        scanner = ZAPScanner()
-        is_running = scanner.check_zap_status()
-        return JsonResponse({"zap_running": is_running})
+        instances = await sync_to_async(get_all_zap_health)()
+        if all(instance['healthy'] is None for instance in instances):
+            # No heartbeat yet (monitor disabled or just started): probe the default instance
+            is_running = await AsyncZAPScanner().check_zap_status()
+        else:
+            is_running = any(instance['healthy'] for instance in instances)
+        return JsonResponse({"zap_running": is_running, "instances": instances})
     except Exception as e:
         return JsonResponse({"zap_running": False, "error": str(e)})
 
@@ -230,12 +464,16 @@ def cancel_scan(request, scan_id):
         return JsonResponse({"error": "Scan cannot be cancelled"}, status=400)
     
     try:
-        # Update scan status to cancelled
+        # Update scan status to cancelled; running engines see this at their next checkpoint
         scan_result.status = 'cancelled'
         scan_result.save()
         
-        # TODO: Add actual ZAP scan cancellation here
-        # For now, we just mark it as cancelled in the database
+        # Stop engine work right away where the saved handle allows it (e.g. ZAP scan IDs)
+        for engine_run in scan_result.engine_runs.filter(status='running'):
+            try:
+                get_engine(engine_run.engine).cancel(engine_run.handle)
+            except Exception as e:
+                logger.warning(f"Could not cancel {engine_run.engine} for scan {scan_id}: {e}")
         
         return JsonResponse({
             "success": True,
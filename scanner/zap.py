@@ -1,7 +1,11 @@
+import httpx
+import re
 import requests
 import time
 import logging
-from typing import Dict, Any, Optional
+import uuid
+from typing import Callable, Dict, Any, List, Optional
+from urllib.parse import urlsplit
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -9,11 +13,122 @@ logger = logging.getLogger(__name__)
 # ZAP API configuration
 ZAP_API = getattr(settings, 'ZAP_API_URL', "http://localhost:8080")
 ZAP_API_KEY = getattr(settings, 'ZAP_API_KEY', None)
+ZAP_ASYNC_TIMEOUT = getattr(settings, 'ZAP_ASYNC_TIMEOUT', 5.0)
+# Seconds before a blocking ZAP API call is abandoned; ZAP can hang without closing the connection
+ZAP_REQUEST_TIMEOUT = getattr(settings, 'ZAP_REQUEST_TIMEOUT', 30.0)
+# Alerts fetched per request when exporting a scan's alerts
+ZAP_ALERT_PAGE_SIZE = getattr(settings, 'ZAP_ALERT_PAGE_SIZE', 500)
+# Maximum number of subtree active scans run side by side in pipelined mode
+ZAP_PIPELINE_CONCURRENCY = getattr(settings, 'ZAP_PIPELINE_CONCURRENCY', 2)
+
+# Named scan performance profiles. Durations are in minutes (0 = unlimited).
+DEFAULT_SCAN_PROFILE = 'balanced'
+SCAN_PROFILES = getattr(settings, 'ZAP_SCAN_PROFILES', {
+    'fast': {
+        'spider_max_depth': 3,
+        'spider_max_duration': 2,
+        'spider_thread_count': 10,
+        'thread_per_host': 10,
+        'max_rule_duration': 1,
+        'max_scan_duration': 10,
+        'delay_in_ms': 0,
+    },
+    'balanced': {
+        'spider_max_depth': 5,
+        'spider_max_duration': 5,
+        'spider_thread_count': 5,
+        'thread_per_host': 5,
+        'max_rule_duration': 5,
+        'max_scan_duration': 30,
+        'delay_in_ms': 0,
+    },
+    'deep': {
+        'spider_max_depth': 10,
+        'spider_max_duration': 0,
+        'spider_thread_count': 4,
+        'thread_per_host': 4,
+        'max_rule_duration': 0,
+        'max_scan_duration': 0,
+        'delay_in_ms': 0,
+    },
+})
+
+# Profile option -> (ZAP component, option setter). All setters take an 'Integer'.
+ZAP_PROFILE_OPTIONS = {
+    'spider_max_depth': ('spider', 'setOptionMaxDepth'),
+    'spider_max_duration': ('spider', 'setOptionMaxDuration'),
+    'spider_thread_count': ('spider', 'setOptionThreadCount'),
+    'thread_per_host': ('ascan', 'setOptionThreadPerHost'),
+    'max_rule_duration': ('ascan', 'setOptionMaxRuleDurationInMins'),
+    'max_scan_duration': ('ascan', 'setOptionMaxScanDurationInMins'),
+    'delay_in_ms': ('ascan', 'setOptionDelayInMs'),
+}
+
+class ScanCancelled(Exception):
+    """Raised from a checkpoint to stop a scan that was cancelled by the user"""
+
+class LeaseLost(Exception):
+    """Raised from a checkpoint when another worker took the scan over; its engine scans are left to that worker"""
+
+class ZAPInstancesBusy(Exception):
+    """Raised when scheduling a scan while every healthy ZAP instance is already scanning its host"""
+
+def resolve_scan_profile(name: Optional[str] = None, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """
+    Resolve a named profile plus per-scan overrides into ZAP engine options
+
+    Raises:
+        ValueError: If the profile name or an override is unknown or not an integer,
+            or overrides is not a dict
+    """
+    name = name or DEFAULT_SCAN_PROFILE
+    if not isinstance(name, str) or name not in SCAN_PROFILES:
+        raise ValueError(f"Unknown scan profile '{name}'. Choose from: {', '.join(SCAN_PROFILES)}")
+
+    if overrides is not None and not isinstance(overrides, dict):
+        raise ValueError("overrides must be an object")
+
+    options = dict(SCAN_PROFILES[name])
+    for option, value in (overrides or {}).items():
+        if option not in ZAP_PROFILE_OPTIONS:
+            raise ValueError(f"Unknown scan option '{option}'")
+        try:
+            options[option] = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Scan option '{option}' must be an integer")
+        if options[option] < 0:
+            raise ValueError(f"Scan option '{option}' must not be negative")
+    return options
+
+def summarize_alerts(alerts: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Count alerts by risk level"""
+    summary = {
+        'total_alerts': len(alerts),
+        'high_risk': 0,
+        'medium_risk': 0,
+        'low_risk': 0,
+        'informational': 0
+    }
+    
+    for alert in alerts:
+        risk = alert.get('risk', 'Informational')
+        if risk == 'High':
+            summary['high_risk'] += 1
+        elif risk == 'Medium':
+            summary['medium_risk'] += 1
+        elif risk == 'Low':
+            summary['low_risk'] += 1
+        else:
+            summary['informational'] += 1
+    
+    return summary
 
 class ZAPScanner:
-    def __init__(self, api_url: str = ZAP_API, api_key: Optional[str] = ZAP_API_KEY):
+    def __init__(self, api_url: str = ZAP_API, api_key: Optional[str] = ZAP_API_KEY,
+                 timeout: float = ZAP_REQUEST_TIMEOUT):
         self.api_url = api_url.rstrip('/')
         self.api_key = api_key
+        self.timeout = timeout
         self.session = requests.Session()
         if self.api_key:
             self.session.params = {'apikey': self.api_key}
@@ -22,7 +137,7 @@ class ZAPScanner:
         """Make a request to ZAP API with error handling"""
         try:
             url = f"{self.api_url}{endpoint}"
-            response = self.session.get(url, params=params or {})
+            response = self.session.get(url, params=params or {}, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -40,13 +155,51 @@ class ZAPScanner:
         except:
             return False
     
-    def start_spider_scan(self, target_url: str, max_children: int = 10) -> str:
+    def get_version(self) -> str:
+        """Get the ZAP version string"""
+        return self._make_request("/JSON/core/view/version/")['version']
+    
+    def get_scan_load(self) -> int:
+        """Number of spider and active scans currently running on this instance"""
+        load = 0
+        for component in ('spider', 'ascan'):
+            scans = self._make_request(f"/JSON/{component}/view/scans/").get('scans', [])
+            load += sum(1 for scan in scans if scan.get('state') == 'RUNNING')
+        return load
+    
+    def set_option(self, component: str, setter: str, value: int) -> None:
+        """Set a global ZAP engine option, e.g. ('ascan', 'setOptionThreadPerHost')"""
+        self._make_request(f"/JSON/{component}/action/{setter}/", {'Integer': value})
+    
+    def apply_profile(self, profile: Dict[str, int], component: str) -> None:
+        """Apply the profile options that belong to one ZAP component ('spider' or 'ascan')"""
+        for option, value in profile.items():
+            option_component, setter = ZAP_PROFILE_OPTIONS.get(option, (None, None))
+            if option_component == component:
+                self.set_option(component, setter, value)
+    
+    def create_context(self, context_name: str, target_url: str) -> str:
+        """Create a context covering everything under target_url and return its ID"""
+        result = self._make_request("/JSON/context/action/newContext/", {'contextName': context_name})
+        self._make_request("/JSON/context/action/includeInContext/", {
+            'contextName': context_name,
+            'regex': re.escape(target_url) + '.*'
+        })
+        return str(result['contextId'])
+    
+    def remove_context(self, context_name: str) -> None:
+        """Remove a context"""
+        self._make_request("/JSON/context/action/removeContext/", {'contextName': context_name})
+    
+    def start_spider_scan(self, target_url: str, max_children: int = 10, context_name: Optional[str] = None) -> str:
         """Start a spider scan and return scan ID"""
         params = {
             'url': target_url,
             'maxChildren': max_children,
             'recurse': 'true'
         }
+        if context_name:
+            params['contextName'] = context_name
         result = self._make_request("/JSON/spider/action/scan/", params)
         scan_id = result.get('scan')
         if not scan_id:
@@ -58,13 +211,25 @@ class ZAPScanner:
         result = self._make_request("/JSON/spider/view/status/", {'scanId': scan_id})
         return int(result.get('status', 0))
     
-    def start_active_scan(self, target_url: str, scan_policy: str = "Default Policy") -> str:
+    def stop_spider_scan(self, scan_id: str) -> None:
+        """Stop a running spider scan"""
+        self._make_request("/JSON/spider/action/stop/", {'scanId': scan_id})
+    
+    def get_spider_results(self, scan_id: str) -> List[str]:
+        """Get the URLs found so far by a spider scan, in discovery order"""
+        result = self._make_request("/JSON/spider/view/results/", {'scanId': scan_id})
+        return result.get('results', [])
+    
+    def start_active_scan(self, target_url: str, scan_policy: str = "Default Policy", recurse: bool = True,
+                          context_id: Optional[str] = None) -> str:
         """Start an active scan and return scan ID"""
         params = {
             'url': target_url,
             'scanPolicyName': scan_policy,
-            'recurse': 'true'
+            'recurse': 'true' if recurse else 'false'
         }
+        if context_id:
+            params['contextId'] = context_id
         result = self._make_request("/JSON/ascan/action/scan/", params)
         scan_id = result.get('scan')
         if not scan_id:
@@ -76,6 +241,10 @@ class ZAPScanner:
         result = self._make_request("/JSON/ascan/view/status/", {'scanId': scan_id})
         return int(result.get('status', 0))
     
+    def stop_active_scan(self, scan_id: str) -> None:
+        """Stop a running active scan"""
+        self._make_request("/JSON/ascan/action/stop/", {'scanId': scan_id})
+    
     def get_alerts(self, base_url: str = None) -> Dict[str, Any]:
         """Get scan alerts/results"""
         params = {}
@@ -83,31 +252,265 @@ class ZAPScanner:
             params['baseurl'] = base_url
         return self._make_request("/JSON/core/view/alerts/", params)
     
+    def get_all_alerts(self, base_url: str = None, page_size: int = ZAP_ALERT_PAGE_SIZE) -> List[Dict[str, Any]]:
+        """Export all alerts under base_url, a page at a time"""
+        alerts = []
+        while True:
+            params = {'start': len(alerts), 'count': page_size}
+            if base_url:
+                params['baseurl'] = base_url
+            page = self._make_request("/JSON/core/view/alerts/", params).get('alerts', [])
+            alerts.extend(page)
+            if len(page) < page_size:
+                return alerts
+    
+    def delete_alerts(self, base_url: str, context_name: Optional[str] = None) -> None:
+        """Delete the alerts raised under base_url (and in the given context)"""
+        params = {'baseurl': base_url}
+        if context_name:
+            params['contextName'] = context_name
+        self._make_request("/JSON/alert/action/deleteAlerts/", params)
+    
+    def delete_site_node(self, url: str) -> None:
+        """Remove a site tree node with its children and their history"""
+        self._make_request("/JSON/core/action/deleteSiteNode/", {'url': url})
+    
+    def cleanup_scan(self, target_url: str, context_name: Optional[str] = None) -> None:
+        """
+        Drop a finished scan's alerts, site tree and context from ZAP
+        
+        Each step is best effort: a failure is logged and the rest still runs.
+        """
+        steps = [
+            ('alerts', lambda: self.delete_alerts(target_url, context_name)),
+            ('site tree', lambda: self.delete_site_node(target_url)),
+        ]
+        if context_name:
+            steps.append(('context', lambda: self.remove_context(context_name)))
+        for label, step in steps:
+            try:
+                step()
+            except Exception as e:
+                logger.warning(f"Could not clean up ZAP {label} of {target_url}: {e}")
+    
     def get_scan_summary(self, base_url: str = None) -> Dict[str, Any]:
         """Get a summary of scan results"""
-        alerts = self.get_alerts(base_url)
-        summary = {
-            'total_alerts': len(alerts.get('alerts', [])),
-            'high_risk': 0,
-            'medium_risk': 0,
-            'low_risk': 0,
-            'informational': 0
-        }
+        return summarize_alerts(self.get_alerts(base_url).get('alerts', []))
+
+class AsyncZAPScanner:
+    """Non-blocking ZAP API client for use from async views"""
+
+    def __init__(self, api_url: str = ZAP_API, api_key: Optional[str] = ZAP_API_KEY,
+                 timeout: float = ZAP_ASYNC_TIMEOUT):
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+
+    async def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Make a request to ZAP API with error handling"""
+        params = dict(params or {})
+        if self.api_key:
+            params['apikey'] = self.api_key
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(f"{self.api_url}{endpoint}", params=params)
+                response.raise_for_status()
+                return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"ZAP API request failed: {e}")
+            raise Exception(f"Failed to connect to ZAP API: {e}")
+        except ValueError as e:
+            logger.error(f"ZAP API returned invalid JSON: {e}")
+            raise Exception(f"Invalid response from ZAP API: {e}")
+
+    async def check_zap_status(self) -> bool:
+        """Check if ZAP is running and accessible"""
+        try:
+            result = await self._make_request("/JSON/core/view/version/")
+            return 'version' in result
+        except Exception:
+            return False
+
+def _target_base(target_url: str) -> str:
+    """Directory path covered by a scan target (e.g. /app/ for http://host/app)"""
+    path = urlsplit(target_url).path
+    return path if path.endswith('/') else f"{path}/"
+
+def _in_target(url: str, target_url: str) -> bool:
+    """Whether a URL lies under the scan target, and so inside the scan's context"""
+    parts, target = urlsplit(url), urlsplit(target_url)
+    return (
+        (parts.scheme.lower(), parts.netloc.lower()) == (target.scheme.lower(), target.netloc.lower())
+        and f"{parts.path}/".startswith(_target_base(target_url))
+    )
+
+def _subtree_root(url: str, target_url: str) -> Optional[str]:
+    """
+    First directory below the scan target that contains a URL (e.g.
+    http://host/app/sub/ for target http://host/app/), or None for pages
+    directly under the target
+    """
+    parts = urlsplit(url)
+    base = _target_base(target_url)
+    directories = parts.path[len(base):].split('/')[:-1]
+    if not directories or not directories[0]:
+        return None
+    return f"{parts.scheme}://{parts.netloc}{base}{directories[0]}/"
+
+def new_context_name() -> str:
+    """Unique ZAP context name for one scan"""
+    return f"openeye-{uuid.uuid4().hex[:12]}"
+
+def _no_checkpoint(state: Dict[str, Any]) -> None:
+    pass
+
+def _wait_for_active_scans(scanner: ZAPScanner, active_ids: List[str],
+                           checkpoint: Callable[[Dict[str, Any]], None] = None,
+                           state: Dict[str, Any] = None) -> None:
+    """Block until all given active scans reach 100%"""
+    pending = list(active_ids)
+    while pending:
+        pending = [scan_id for scan_id in pending if scanner.get_active_scan_status(scan_id) < 100]
+        if pending:
+            if checkpoint:
+                checkpoint(state)
+            time.sleep(5)
+
+def _run_sequential_phases(scanner: ZAPScanner, target_url: str, max_children: int,
+                           scan_policy: str, profile: Dict[str, int],
+                           state: Dict[str, Any], checkpoint: Callable[[Dict[str, Any]], None]) -> None:
+    """Spider to 100%, then active scan the whole target"""
+    # 1. Start spider scan
+    if not state.get('spider_id'):
+        logger.info(f"Starting spider scan for {target_url}")
+        scanner.apply_profile(profile, 'spider')
+        state['spider_id'] = scanner.start_spider_scan(target_url, max_children, state.get('context_name'))
+        checkpoint(state)
+    
+    # 2. Wait for spider to complete
+    if not state.get('active_id'):
+        logger.info("Waiting for spider scan to complete...")
+        while True:
+            status = scanner.get_spider_status(state['spider_id'])
+            if status >= 100:
+                break
+            checkpoint(state)
+            time.sleep(2)
         
-        for alert in alerts.get('alerts', []):
-            risk = alert.get('risk', 'Informational')
-            if risk == 'High':
-                summary['high_risk'] += 1
-            elif risk == 'Medium':
-                summary['medium_risk'] += 1
-            elif risk == 'Low':
-                summary['low_risk'] += 1
+        logger.info("Spider scan completed, starting active scan...")
+        
+        # 3. Start active scan
+        scanner.apply_profile(profile, 'ascan')
+        state['active_id'] = scanner.start_active_scan(target_url, scan_policy, context_id=state.get('context_id'))
+        checkpoint(state)
+    
+    # 4. Wait for active scan to complete
+    logger.info("Waiting for active scan to complete...")
+    _wait_for_active_scans(scanner, [state['active_id']], checkpoint, state)
+
+def _run_pipelined_phases(scanner: ZAPScanner, target_url: str, max_children: int,
+                          scan_policy: str, profile: Dict[str, int],
+                          state: Dict[str, Any], checkpoint: Callable[[Dict[str, Any]], None],
+                          concurrency: int = ZAP_PIPELINE_CONCURRENCY) -> None:
+    """
+    Active scan URL subtrees while the spider is still crawling
+    
+    New spider results are read incrementally. Subtrees are the directories
+    directly below target_url; one is handed to the active scanner once a
+    poll finds no new URLs under it. URLs discovered after their subtree scan
+    started, and pages directly under target_url, are covered by a short
+    non-recursive catch-up pass once the spider has finished. URLs outside
+    target_url are outside the scan's context and are skipped.
+    """
+    if not state.get('spider_id'):
+        logger.info(f"Starting pipelined scan for {target_url}")
+        scanner.apply_profile(profile, 'spider')
+        scanner.apply_profile(profile, 'ascan')
+        state.update({
+            'spider_id': scanner.start_spider_scan(target_url, max_children, state.get('context_name')),
+            'seen_count': 0,
+            'waiting': {},          # subtree root -> True if it grew during the last poll
+            'started': [],          # subtree roots handed to the active scanner
+            'running': [],          # active scan IDs still in progress
+            'catch_up': [target_url],
+            'catch_up_started': False,
+        })
+        checkpoint(state)
+    
+    spider_id = state['spider_id']
+    waiting = state['waiting']
+    started = set(state['started'])
+    catch_up = set(state['catch_up'])
+    spider_done = False
+    
+    while not state['catch_up_started']:
+        spider_done = spider_done or scanner.get_spider_status(spider_id) >= 100
+        
+        # Read only the spider results we have not seen yet
+        results = scanner.get_spider_results(spider_id)
+        for url in results[state['seen_count']:]:
+            if not _in_target(url, target_url):
+                continue
+            root = _subtree_root(url, target_url)
+            if root is None or root in started:
+                catch_up.add(url)
             else:
-                summary['informational'] += 1
+                waiting[root] = True
+        state['seen_count'] = len(results)
+        
+        # Start stable subtrees (or all of them once the spider is done)
+        running = [scan_id for scan_id in state['running'] if scanner.get_active_scan_status(scan_id) < 100]
+        for root, grew in list(waiting.items()):
+            if len(running) >= concurrency:
+                break
+            if grew and not spider_done:
+                waiting[root] = False
+                continue
+            del waiting[root]
+            started.add(root)
+            try:
+                running.append(scanner.start_active_scan(root, scan_policy, context_id=state.get('context_id')))
+                logger.info(f"Active scanning subtree {root}")
+            except Exception as e:
+                logger.warning(f"Could not active scan subtree {root}, deferring to catch-up: {e}")
+                catch_up.update(url for url in results if url.startswith(root))
         
-        return summary
+        state.update({'started': sorted(started), 'running': running, 'catch_up': sorted(catch_up)})
+        if spider_done and not waiting and not running:
+            state['catch_up_started'] = True
+        checkpoint(state)
+        if not state['catch_up_started']:
+            time.sleep(2)
+    
+    # Catch-up: single nodes missed by the subtree scans
+    logger.info(f"Subtree scans completed, catching up on {len(state['catch_up'])} URLs...")
+    while state['catch_up'] or state['running']:
+        running = [scan_id for scan_id in state['running'] if scanner.get_active_scan_status(scan_id) < 100]
+        while state['catch_up'] and len(running) < concurrency:
+            url = state['catch_up'].pop()
+            try:
+                running.append(scanner.start_active_scan(url, scan_policy, recurse=False,
+                                                         context_id=state.get('context_id')))
+            except Exception as e:
+                logger.warning(f"Could not active scan {url}: {e}")
+        state['running'] = running
+        checkpoint(state)
+        if running:
+            time.sleep(2)
 
-def start_scan(target_url: str, max_children: int = 10, scan_policy: str = "Default Policy") -> Dict[str, Any]:
+def _can_resume(scanner: ZAPScanner, state: Dict[str, Any]) -> bool:
+    """Whether ZAP still knows the spider of an interrupted scan"""
+    try:
+        scanner.get_spider_status(state['spider_id'])
+        return True
+    except Exception:
+        return False
+
+def start_scan(target_url: str, max_children: int = 10, scan_policy: str = "Default Policy",
+               profile: Optional[Dict[str, int]] = None, pipelined: bool = False,
+               state: Optional[Dict[str, Any]] = None,
+               checkpoint: Optional[Callable[[Dict[str, Any]], None]] = None,
+               api_url: Optional[str] = None, cleanup: bool = True) -> Dict[str, Any]:
     """
     Start a complete ZAP scan (spider + active scan) and return results
     
@@ -115,57 +518,77 @@ def start_scan(target_url: str, max_children: int = 10, scan_policy: str = "Defa
         target_url: URL to scan
         max_children: Maximum number of children to crawl
         scan_policy: ZAP scan policy to use
+        profile: Engine options from resolve_scan_profile(), applied before each phase.
+            ZAP options are global, so concurrent scans on one ZAP instance share them.
+        pipelined: Start active scanning subtrees while the spider is still running
+        state: Saved state of an interrupted scan (spider/active scan IDs) to resume from.
+            Updated in place as the scan progresses.
+        checkpoint: Called with `state` on every poll so it can be persisted
+        api_url: ZAP instance to use; by default the least loaded healthy instance
+            from the health monitor (a resumed scan stays on its original instance)
+        cleanup: Remove the scan's alerts, site tree and context from ZAP once its
+            alerts are exported (or the scan failed)
     
     Returns:
         Dictionary containing scan results and summary
     """
-    scanner = ZAPScanner()
+    from .health import pick_zap_instance
+
+    profile = profile if profile is not None else resolve_scan_profile()
+    state = state if state is not None else {}
+    checkpoint = checkpoint or _no_checkpoint
     
-    # Check if ZAP is running
-    if not scanner.check_zap_status():
-        raise Exception("ZAP is not running or not accessible. Please ensure ZAP is running on the configured port.")
+    if state.get('spider_id'):
+        # Scans saved before instances were tracked ran on the default instance
+        state.setdefault('api_url', ZAP_API)
+        scanner = ZAPScanner(state['api_url'])
+        if _can_resume(scanner, state):
+            logger.info(f"Resuming ZAP scan of {target_url} (spider {state['spider_id']})")
+        else:
+            logger.warning(f"ZAP no longer knows spider {state['spider_id']}, restarting scan of {target_url}")
+            state.clear()
+    
+    # Use the cached instance health instead of probing ZAP before every scan
+    if not state.get('spider_id'):
+        state['api_url'] = api_url or pick_zap_instance(target_url)
+    state['target_url'] = target_url
+    scanner = ZAPScanner(state['api_url'])
     
     try:
-        # 1. Start spider scan
-        logger.info(f"Starting spider scan for {target_url}")
-        spider_id = scanner.start_spider_scan(target_url, max_children)
+        state.setdefault('mode', 'pipelined' if pipelined else 'sequential')
         
-        # 2. Wait for spider to complete
-        logger.info("Waiting for spider scan to complete...")
-        while True:
-            status = scanner.get_spider_status(spider_id)
-            if status >= 100:
-                break
-            time.sleep(2)
-        
-        logger.info("Spider scan completed, starting active scan...")
+        # Each scan runs in its own context. Sessions are global to a ZAP instance,
+        # so a new session per scan would wipe out every other scan running on it.
+        if not state.get('context_name'):
+            state['context_name'] = new_context_name()
+            state['context_id'] = scanner.create_context(state['context_name'], target_url)
+            checkpoint(state)
         
-        # 3. Start active scan
-        active_id = scanner.start_active_scan(target_url, scan_policy)
-        
-        # 4. Wait for active scan to complete
-        logger.info("Waiting for active scan to complete...")
-        while True:
-            status = scanner.get_active_scan_status(active_id)
-            if status >= 100:
-                break
-            time.sleep(5)
+        if state['mode'] == 'pipelined':
+            _run_pipelined_phases(scanner, target_url, max_children, scan_policy, profile, state, checkpoint)
+        else:
+            _run_sequential_phases(scanner, target_url, max_children, scan_policy, profile, state, checkpoint)
         
         logger.info("Active scan completed, fetching results...")
         
-        # 5. Get results
-        alerts = scanner.get_alerts(target_url)
-        summary = scanner.get_scan_summary(target_url)
+        # 5. Export results, then drop them from ZAP so its alert store does not keep growing
+        alerts = scanner.get_all_alerts(target_url)
+        if cleanup:
+            scanner.cleanup_scan(target_url, state['context_name'])
         
         return {
-            'alerts': alerts.get('alerts', []),
-            'summary': summary,
+            'alerts': alerts,
+            'summary': summarize_alerts(alerts),
             'target_url': target_url,
             'scan_completed': True
         }
         
+    except (ScanCancelled, LeaseLost):
+        raise
     except Exception as e:
         logger.error(f"Scan failed: {e}")
+        if cleanup:
+            scanner.cleanup_scan(target_url, state.get('context_name'))
         return {
             'error': str(e),
             'target_url': target_url,